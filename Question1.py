@@ -15,142 +15,1262 @@ from PIL import Image, ImageTk
 import os
 from pathlib import Path
 import uuid
+import tempfile
+import queue
+import sys
+import time
+import json
+import argparse
+import hashlib
+import threading
+import copy
+import statistics
+import platform
+import tracemalloc
+import functools
+import csv
+import sqlite3
+import itertools
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+
+def show_error(message):
+    """Default error reporter for the editor: a message box"""
+    messagebox.showerror("Error", message)
+
+
+def raise_error(message):
+    """Error reporter for headless use, turning the message into an exception"""
+    raise RuntimeError(message)
+
+
+CACHE_DIR = Path(tempfile.gettempdir()) / "image_editor_cache"
+CACHE_BYTES = 4 * 1024 ** 3
+RAW_CACHE_PIXELS = 20_000_000  # the editor keeps a memory-mapped raw copy of sources this big
+SESSION_DIR = CACHE_DIR / "sessions"
+SESSION_BYTES = 8 * 1024 ** 3
+THUMBNAIL_DIR = CACHE_DIR / "thumbnails"  # kept out of CACHE_DIR so prune_cache never deletes the open database
+
+
+def resident_memory():
+    """Resident set size of this process in bytes, or None where it cannot be read"""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+        # ru_maxrss is the peak, in kilobytes on Linux and bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+    except ImportError:
+        return None
+
+
+def file_key(file_path):
+    """Cache key for a file: its absolute path, modification time and size"""
+    stat = os.stat(file_path)
+    return f"{os.path.abspath(file_path)}|{stat.st_mtime_ns}|{stat.st_size}"
+
+
+def as_tuples(value):
+    """Turn the nested lists JSON gives back into the tuples operations are made of"""
+    if isinstance(value, list):
+        return tuple(as_tuples(item) for item in value)
+    return value
+
+
+def prune_cache(directory, max_bytes):
+    """Delete the least recently used files in a cache directory until it fits max_bytes"""
+    files = [path for path in Path(directory).glob("*") if path.is_file()]
+    files.sort(key=lambda path: path.stat().st_mtime)
+    total = sum(path.stat().st_size for path in files)
+    for path in files:
+        if total <= max_bytes:
+            break
+        total -= path.stat().st_size
+        path.unlink(missing_ok=True)
+
+
+class Profiler:
+    """Rolling record of operation timings, off unless enabled by flag, env var or the panel
+
+    Each record holds the operation name, wall time, input and output (width, height)
+    and, when track_memory is on, the bytes allocated at peak during the call.
+    """
+    def __init__(self, window=500):
+        self.enabled = False
+        self.track_memory = False
+        self.records = deque(maxlen=window)
+
+    def enable(self, track_memory=False):
+        self.enabled = True
+        self.track_memory = track_memory
+        if track_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def disable(self):
+        self.enabled = False
+        if self.track_memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self.track_memory = False
+
+    def add(self, name, seconds, input_size, output_size, allocated):
+        self.records.append({
+            "operation": name,
+            "time": time.time(),
+            "seconds": seconds,
+            "input_size": input_size,
+            "output_size": output_size,
+            "allocated_bytes": allocated,
+        })
+
+    def summary(self):
+        """Per-operation count, mean, p95 and max seconds over the window"""
+        grouped = {}
+        for record in list(self.records):
+            grouped.setdefault(record["operation"], []).append(record["seconds"])
+        rows = []
+        for name, times in sorted(grouped.items()):
+            times.sort()
+            rows.append({"operation": name, "count": len(times), "mean": sum(times) / len(times),
+                         "p95": times[min(len(times) - 1, int(len(times) * 0.95))], "max": times[-1]})
+        return rows
+
+    def export_json(self, path):
+        with open(path, "w") as handle:
+            json.dump(list(self.records), handle, indent=2)
+
+    def export_csv(self, path):
+        fields = ["operation", "time", "seconds", "input_size", "output_size", "allocated_bytes"]
+        with open(path, "w", newline="") as handle:
+            writer = csv.DictWriter(handle, fieldnames=fields)
+            writer.writeheader()
+            for record in list(self.records):
+                writer.writerow({**record, "input_size": "x".join(map(str, record["input_size"] or ())),
+                                 "output_size": "x".join(map(str, record["output_size"] or ()))})
+
+
+PROFILER = Profiler()
+if os.environ.get("IMAGE_EDITOR_PROFILE"):
+    PROFILER.enable(track_memory=os.environ["IMAGE_EDITOR_PROFILE"] == "memory")
+
+
+def instrumented(name):
+    """Record calls of a method in PROFILER; costs one attribute check while profiling is off
+
+    The input size is taken from the first array argument, or else from the object's
+    profile_size(); the output size is profile_size() after the call.
+    """
+    def decorate(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if not PROFILER.enabled:
+                return method(self, *args, **kwargs)
+            arrays = [arg for arg in args if isinstance(arg, np.ndarray)]
+            input_size = arrays[0].shape[1::-1] if arrays else self.profile_size()
+            tracking = PROFILER.track_memory and tracemalloc.is_tracing()
+            if tracking:
+                tracemalloc.reset_peak()
+                base = tracemalloc.get_traced_memory()[0]
+            start = time.perf_counter()
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                seconds = time.perf_counter() - start
+                allocated = tracemalloc.get_traced_memory()[1] - base if tracking else None
+                PROFILER.add(name, seconds, input_size, self.profile_size(), allocated)
+        return wrapper
+    return decorate
+
+
+def tone_lut(kind, params):
+    """256-entry lookup table for a tone operation, computed over all input levels at once
+
+    "adjust" takes (brightness, contrast, gamma, black, white): levels stretch black..white
+    to 0..255, then gamma, then contrast around mid-grey, then a brightness offset.
+    "curves" takes ((in, out), ...) control points, interpolated linearly.
+    """
+    x = np.arange(256, dtype=np.float64)
+    if kind == "adjust":
+        brightness, contrast, gamma, black, white = params
+        x = np.clip((x - black) / (white - black), 0.0, 1.0)
+        x = 255.0 * x ** (1.0 / gamma)
+        x = (x - 128.0) * contrast + 128.0 + brightness
+    elif kind == "curves":
+        points = sorted(params)
+        x = np.interp(x, [point[0] for point in points], [point[1] for point in points])
+    else:
+        raise ValueError(f"Unknown tone operation: {kind}")
+    return np.clip(np.rint(x), 0, 255).astype(np.uint8)
+
+
+class PreviewPyramid:
+    """Cached mip-map of an image so previews never have to touch the full-resolution pixels
+
+    With image=None the pyramid only knows the full size; level 0 comes from loader
+    on first use, so a seeded coarse level can serve previews without it. Levels may
+    be built from several threads: the work happens outside the lock, and the first
+    result stored wins.
+    """
+    def __init__(self, image, min_size=256, size=None, loader=None):
+        self.levels = {} if image is None else {0: image}
+        self.loader = loader
+        self.rgb_levels = {}
+        self.rendered = {}
+        self.lock = threading.Lock()
+
+        # Halve until the smallest level is close to min_size; levels are built on first use
+        if image is not None:
+            h, w = image.shape[:2]
+        else:
+            w, h = size
+        self.size = (w, h)
+        self.count = 1
+        while max(h, w) >= min_size * 2:
+            h, w = h // 2, w // 2
+            self.count += 1
+
+    @property
+    def source(self):
+        return self.level(0)
+
+    def seed(self, index, image):
+        """Provide a coarse level directly, e.g. from a reduced-resolution decode"""
+        with self.lock:
+            self.levels[index] = image
+
+    def level_size(self, index):
+        """(width, height) of a level without building it"""
+        level = self.levels.get(index)
+        if level is not None:
+            h, w = level.shape[:2]
+            return w, h
+        w, h = self.size
+        return max(1, w >> index), max(1, h >> index)
+
+    def level(self, index):
+        """Pixels of a level, built from the next finer one when first asked for"""
+        with self.lock:
+            if index in self.levels:
+                return self.levels[index]
+        if index == 0:
+            image = self.loader()
+        else:
+            finer = self.level(index - 1)
+            h, w = finer.shape[:2]
+            image = cv2.resize(finer, (max(1, w // 2), max(1, h // 2)), interpolation=cv2.INTER_AREA)
+        with self.lock:
+            return self.levels.setdefault(index, image)
+
+    def level_for(self, width, height):
+        """Index of the smallest level that still covers the requested size"""
+        for index in range(self.count - 1, -1, -1):
+            w, h = self.level_size(index)
+            if w >= width and h >= height:
+                return index
+        return 0
+
+    def rgb(self, index):
+        """RGB copy of a level, converted once and reused by every redraw"""
+        with self.lock:
+            if index in self.rgb_levels:
+                return self.rgb_levels[index]
+        level = self.level(index)
+        code = cv2.COLOR_GRAY2RGB if level.ndim == 2 else cv2.COLOR_BGR2RGB
+        rgb = cv2.cvtColor(level, code)
+        with self.lock:
+            return self.rgb_levels.setdefault(index, rgb)
+
+    def render(self, display_size):
+        """PIL image of the whole picture at display_size, cached per size"""
+        with self.lock:
+            if display_size in self.rendered:
+                return self.rendered[display_size]
+        rgb = self.rgb(self.level_for(*display_size))
+        if (rgb.shape[1], rgb.shape[0]) != display_size:
+            shrinking = rgb.shape[1] > display_size[0]
+            rgb = cv2.resize(rgb, display_size, interpolation=cv2.INTER_AREA if shrinking else cv2.INTER_LINEAR)
+        with self.lock:
+            return self.rendered.setdefault(display_size, Image.fromarray(rgb))
+
+
+class SourceImage:
+    """Full-resolution source pixels, decoded at most once and shared by a processor and its snapshots"""
+    def __init__(self, loader=None, image=None):
+        self.loader = loader
+        self.image = image
+        self.lock = threading.Lock()
+
+    def get(self):
+        with self.lock:
+            if self.image is None:
+                self.image = self.loader()
+            return self.image
 
 
 class ImageProcessor:
-    """Handling all image processing operations using OpenCV with some functions"""
-    def __init__(self):
-        self.original_image = None
-        self.current_image = None
-        self.undo_stack = []
+    """Handling all image processing operations using OpenCV with some functions
+
+    Edits are recorded as an operation list over original_image instead of being
+    applied straight away. The list is fused into a single region-of-interest
+    resize plus a short chain of per-pixel operations (grayscale and composed tone
+    lookup tables), which is evaluated on a small pyramid level for previews and
+    at full resolution only when it is needed.
+    """
+    def __init__(self, report_error=show_error, preview_size=1200, raw_cache_pixels=None):
+        self.report_error = report_error
+        self.preview_size = preview_size  # fast open decodes at least this much resolution
+        self.raw_cache_pixels = raw_cache_pixels  # images this big get a memory-mapped raw cache; None for none
+        self.source_path = None
+        self.source_size = None
+        self.source_gray = False  # single-channel files stay single-channel
+        self.source = None  # SourceImage, shared with snapshots so the decode happens once
+        self.original_pyramid = None
+        self.load_stats = {}
+        self.operations = []
+        self.redo_operations = []
+        self.rendered = None
+        self.previews = {}
+
+    def has_image(self):
+        return self.source_size is not None
+
+    def profile_size(self):
+        return self.current_size() if self.has_image() else None
+
+    def set_image(self, image):
+        """Use an in-memory image as the source, as if it had just been loaded"""
+        self.source_path = None
+        self.source_size = image.shape[1::-1]
+        self.source_gray = image.ndim == 2
+        self.source = SourceImage(image=image)
+        self.original_pyramid = None
+        self.set_operations([])
+
+    @property
+    def original_image(self):
+        """Full-resolution source, decoded (or memory-mapped from the raw cache) on first use"""
+        return None if self.source is None else self.source.get()
+
+    def set_operations(self, operations, redo_operations=None):
+        """Replace the edit pipeline, dropping every result computed from the old one"""
+        self.operations = list(operations)
+        self.redo_operations = [] if redo_operations is None else list(redo_operations)
+        self.rendered = None
+        self.previews = {}
+
+    def record(self, operation):
+        """Append an edit, merging a run of resizes (slider moves) into one operation"""
+        operations = list(self.operations)
+        if operation[0] == "resize" and operations and operations[-1][0] == "resize":
+            operations.pop()
+        self.set_operations(operations + [operation])
+
+    @property
+    def current_image(self):
+        """Full-resolution result of the pipeline, evaluated on first access"""
+        if not self.has_image():
+            return None
+        if self.rendered is None:
+            self.rendered = self.render()
+        return self.rendered
+
+    def source_pyramid(self):
+        """Preview pyramid of the original image that previews are evaluated from"""
+        if self.original_pyramid is None and self.has_image():
+            self.original_pyramid = PreviewPyramid(self.source.image, size=self.source_size,
+                                                   loader=self.source.get)
+        return self.original_pyramid
+
+    def cache_path(self, file_path, kind):
+        """Cache file for a source image, keyed by its path, modification time and size"""
+        return CACHE_DIR / f"{hashlib.sha1(file_key(file_path).encode()).hexdigest()}.{kind}.npy"
+
+    def reduced_factor(self, w, h):
+        """Largest decode reduction (1, 2, 4 or 8) that still leaves preview_size pixels"""
+        factor = 1
+        while factor < 8 and max(w, h) // (factor * 2) >= self.preview_size:
+            factor *= 2
+        return factor
+
+    def load_full(self, file_path, gray=False):
+        """Decode the full-resolution source, preferring a memory-mapped raw cache"""
+        start = time.perf_counter()
+        raw_path = self.cache_path(file_path, "raw")
+        if raw_path.is_file():
+            # Zero-copy: pages are read from disk only when an operation touches them
+            image = np.load(raw_path, mmap_mode="r")
+            self.load_stats["full_mode"] = "mmap"
+        else:
+            image = cv2.imread(file_path, cv2.IMREAD_GRAYSCALE if gray else cv2.IMREAD_COLOR)
+            if image is None:
+                raise ValueError("Failed to load image")
+            self.load_stats["full_mode"] = "decode"
+            if self.raw_cache_pixels is not None and image.shape[0] * image.shape[1] >= self.raw_cache_pixels:
+                threading.Thread(target=self.write_cache, args=(raw_path, image), daemon=True).start()
+        self.load_stats["full_load_seconds"] = time.perf_counter() - start
+        self.load_stats["resident_bytes"] = resident_memory()
+        return image
+
+    @staticmethod
+    def write_cache(path, image, max_bytes=CACHE_BYTES):
+        """Write an array to the cache atomically, so readers never see a partial file
 
-    def load_image(self, file_path):
-        """Load and validate image from file path using is_file function and checking if it matches the ending"""
+        Returns False when it could not be written; callers of a pure cache can ignore that.
+        """
+        partial = path.with_suffix(f".{uuid.uuid4().hex}.partial")
         try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(partial, "wb") as handle:
+                np.save(handle, image)
+            os.replace(partial, path)
+            prune_cache(path.parent, max_bytes)
+            return True
+        except OSError:
+            partial.unlink(missing_ok=True)
+            return False
+
+    def plan(self, operations=None):
+        """Fuse operations into a source ROI (x1, y1, x2, y2), an output size and per-pixel steps
+
+        Per-pixel steps are ("gray",) and ("lut", table); adjacent tone operations are
+        composed into a single table so each pixel is looked up once.
+        """
+        operations = self.operations if operations is None else operations
+        w, h = self.source_size
+        x1, y1, x2, y2 = 0.0, 0.0, float(w), float(h)
+        out_w, out_h = w, h
+        pixel_steps = []
+        for operation in operations:
+            if operation[0] == "crop":
+                # Crop bounds are in the coordinates of the image at this point of the pipeline
+                a, b, c, d = operation[1]
+                sx, sy = (x2 - x1) / out_w, (y2 - y1) / out_h
+                x1, y1, x2, y2 = x1 + a * sx, y1 + b * sy, x1 + c * sx, y1 + d * sy
+                out_w, out_h = c - a, d - b
+            elif operation[0] == "resize":
+                out_w, out_h = operation[1]
+            elif operation[0] == "grayscale":
+                if not pixel_steps or pixel_steps[-1][0] != "gray":
+                    pixel_steps.append(("gray",))
+            elif operation[0] == "tone":
+                lut = tone_lut(operation[1], operation[2])
+                if pixel_steps and pixel_steps[-1][0] == "lut":
+                    lut = lut[pixel_steps.pop()[1]]  # the earlier table runs first
+                pixel_steps.append(("lut", lut))
+        return (x1, y1, x2, y2), (out_w, out_h), pixel_steps
+
+    @staticmethod
+    def apply_pixel_steps(image, pixel_steps):
+        """Run grayscale conversions and lookup tables, one vectorised pass each"""
+        for step in pixel_steps:
+            if step[0] == "gray":
+                if image.ndim == 3:
+                    image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+            else:
+                image = cv2.LUT(image, step[1])
+        return image
+
+    def current_size(self, operations=None):
+        """(width, height) of the pipeline result without computing any pixels"""
+        if not self.has_image():
+            raise ValueError("No image loaded")
+        return self.plan(operations)[1]
+
+    @instrumented("render")
+    def render(self, operations=None, max_size=None, interpolation=None):
+        """Evaluate the pipeline, at full resolution or fitted inside max_size from a pyramid level"""
+        (x1, y1, x2, y2), (out_w, out_h), pixel_steps = self.plan(operations)
+        if max_size is None:
+            source = self.original_image
+        else:
+            fit = min(1.0, max_size / out_w, max_size / out_h)
+            out_w, out_h = max(1, int(out_w * fit)), max(1, int(out_h * fit))
+
+            # Coarsest level that still has at least one pixel per output pixel over the ROI
+            pyramid = self.source_pyramid()
+            full_w, full_h = pyramid.level_size(0)
+            for index in range(pyramid.count - 1, -1, -1):
+                level_w, level_h = pyramid.level_size(index)
+                fx, fy = level_w / full_w, level_h / full_h
+                if (x2 - x1) * fx >= out_w and (y2 - y1) * fy >= out_h or index == 0:
+                    source = pyramid.level(index)
+                    x1, y1, x2, y2 = x1 * fx, y1 * fy, x2 * fx, y2 * fy
+                    break
+
+        h, w = source.shape[:2]
+        x1, y1 = min(int(round(x1)), w - 1), min(int(round(y1)), h - 1)
+        x2, y2 = max(int(round(x2)), x1 + 1), max(int(round(y2)), y1 + 1)
+        image = source[y1:y2, x1:x2]
+
+        # Per-pixel steps commute with crop (and, closely enough, with resize), so they run once
+        # on the smaller side of the resize. Grayscale stays single-channel; only the display
+        # expands it to RGB.
+        if pixel_steps and out_w * out_h > image.shape[0] * image.shape[1]:
+            image = self.apply_pixel_steps(image, pixel_steps)
+            pixel_steps = []
+
+        if image.shape[1::-1] != (out_w, out_h):
+            if interpolation is None:
+                shrinking = out_w < image.shape[1]
+                interpolation = cv2.INTER_AREA if shrinking else cv2.INTER_LINEAR
+            image = cv2.resize(image, (out_w, out_h), interpolation=interpolation)
+
+        return self.apply_pixel_steps(image, pixel_steps)
+
+    def preview_image(self, max_size, operations=None, interpolation=None):
+        """Pipeline result fitted inside max_size, cached for the current operations"""
+        if operations is not None:
+            return self.render(operations, max_size, interpolation)
+        if max_size not in self.previews:
+            larger = [size for size in self.previews if size > max_size]
+            if larger:
+                # Shrink a bigger cached preview (e.g. one restored with a session) rather than re-render
+                image = self.previews[min(larger)]
+                size = self.fitted_size(max_size)
+                if image.shape[1::-1] != size:
+                    image = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+                self.previews[max_size] = image
+            else:
+                self.previews[max_size] = self.render(max_size=max_size)
+        return self.previews[max_size]
+
+    def fitted_size(self, max_size):
+        """(width, height) of the preview fitted inside max_size"""
+        out_w, out_h = self.current_size()
+        fit = min(1.0, max_size / out_w, max_size / out_h)
+        return max(1, int(out_w * fit)), max(1, int(out_h * fit))
+
+    def store_preview(self, operations, max_size, image):
+        """Keep a preview computed elsewhere (e.g. on a worker) if the pipeline has not moved on since"""
+        if list(operations) == self.operations:
+            self.previews[max_size] = image
+
+    def store_rendered(self, operations, image):
+        """Keep a full-resolution result computed elsewhere if the pipeline has not moved on since"""
+        if list(operations) == self.operations:
+            self.rendered = image
+
+    @instrumented("load_image")
+    def load_image(self, file_path, fast_open=True):
+        """Load and validate image from file path using is_file function and checking if it matches the ending
+
+        With fast_open only a reduced-resolution preview is decoded here (JPEG DCT
+        scaling or a cached downsample); the full image is loaded on first use.
+        """
+        previous = (self.source_path, self.source_size, self.source_gray, self.source, self.original_pyramid)
+        try:
+            start = time.perf_counter()
             # Validate file path
             if not Path(file_path).is_file():
                 raise FileNotFoundError("File does not exist")
             if not file_path.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp')):
                 raise ValueError("Unsupported image format")
 
-            # Read image with OpenCV
-            self.original_image = cv2.imread(file_path)
-            if self.original_image is None:
-                raise ValueError("Failed to load image")
-            
-            self.current_image = self.original_image.copy()
-            self.undo_stack = []  # Reset undo stack on new image load
+            # Only the header is read here; OpenCV applies EXIF rotation, so follow it
+            with Image.open(file_path) as header:
+                w, h = header.size
+                # (PNG keeps EXIF after the pixel data, so only JPEG headers are checked)
+                if header.format == "JPEG" and header.getexif().get(0x0112) in (5, 6, 7, 8):
+                    w, h = h, w
+                gray = header.mode == "L"
+
+            self.source_path = file_path
+            self.source_size = (w, h)
+            self.source_gray = gray
+            self.source = SourceImage(functools.partial(self.load_full, file_path, gray))
+            self.load_stats = {}
+            self.original_pyramid = None
+            pyramid = self.source_pyramid()
+            factor = self.reduced_factor(w, h) if fast_open else 1
+            level = factor.bit_length() - 1
+            preview_path = self.cache_path(file_path, "preview")
+            if factor > 1 and preview_path.is_file():
+                pyramid.seed(level, np.load(preview_path))
+                self.load_stats["open_mode"] = "cached preview"
+            elif factor > 1 and file_path.lower().endswith(('.jpg', '.jpeg')):
+                if gray:
+                    flag = {2: cv2.IMREAD_REDUCED_GRAYSCALE_2, 4: cv2.IMREAD_REDUCED_GRAYSCALE_4,
+                            8: cv2.IMREAD_REDUCED_GRAYSCALE_8}[factor]
+                else:
+                    flag = {2: cv2.IMREAD_REDUCED_COLOR_2, 4: cv2.IMREAD_REDUCED_COLOR_4,
+                            8: cv2.IMREAD_REDUCED_COLOR_8}[factor]
+                reduced = cv2.imread(file_path, flag)
+                if reduced is None:
+                    raise ValueError("Failed to load image")
+                pyramid.seed(level, reduced)
+                self.write_cache(preview_path, reduced)
+                self.load_stats["open_mode"] = "reduced decode"
+            else:
+                # Formats without reduced decoding pay the full decode once, then leave a downsample behind
+                self.source.get()
+                if factor > 1:
+                    self.write_cache(preview_path, pyramid.level(level))
+                self.load_stats["open_mode"] = "full decode"
+            self.load_stats["first_pixel_seconds"] = time.perf_counter() - start
+            self.load_stats["resident_bytes"] = resident_memory()
+
+            self.set_operations([])  # Reset undo history on new image load
             return True
         except Exception as e:
-            messagebox.showerror("Error", f"Failed to load image: {str(e)}")
+            self.source_path, self.source_size, self.source_gray, self.source, self.original_pyramid = previous
+            self.report_error(f"Failed to load image: {str(e)}")
             return False
         
+    @instrumented("crop_image")
     def crop_image(self, x1, y1, x2, y2):
         """setting co-ordinates from where user can crop the particular image"""
         try:
             # Validate coordinates
-            if not self.current_image is None:
-                h, w = self.current_image.shape[:2]
+            if self.has_image():
+                w, h = self.current_size()
                 x1, x2 = max(0, min(x1, x2)), min(w, max(x1, x2))
                 y1, y2 = max(0, min(y1, y2)), min(h, max(y1, y2))
                 
                 if x2 <= x1 or y2 <= y1:
                     raise ValueError("Invalid crop dimensions")
                 
-                # Save for undo operation if the user intends any changes
-                self.undo_stack.append(self.current_image.copy())
-                self.current_image = self.current_image[y1:y2, x1:x2]
+                self.record(("crop", (x1, y1, x2, y2)))
                 return True
         except Exception as e:
-            messagebox.showerror("Error", f"Crop failed: {str(e)}")
+            self.report_error(f"Crop failed: {str(e)}")
             return False
-        
+
+    def resize_operations(self, scale):
+        """Operation list with the trailing resize replaced by one to scale, validating the scale"""
+        if not self.has_image():
+            raise ValueError("No image loaded")
+        if not 0.1 <= scale <= 2.0:
+            raise ValueError("Scale must be between 0.1 and 2.0")
+
+        # The scale is relative to the image before any resize the slider already made
+        operations = list(self.operations)
+        if operations and operations[-1][0] == "resize":
+            operations.pop()
+        w, h = self.current_size(operations)
+        new_size = (max(1, int(w * scale)), max(1, int(h * scale)))
+        return operations + [("resize", new_size)]
+
+    @instrumented("resize_image")
     def resize_image(self, scale):
         """Resize image"""
         """Handling error if no image is loaded"""
         try:
-            if self.current_image is None:
-                raise ValueError("No image loaded")
-            if not 0.1 <= scale <= 2.0:
-                raise ValueError("Scale must be between 0.1 and 2.0")
-            
-            h, w = self.original_image.shape[:2]
-            new_size = (int(w * scale), int(h * scale))
-            self.current_image = cv2.resize(self.original_image, new_size, interpolation=cv2.INTER_AREA)
+            self.set_operations(self.resize_operations(scale))
             return True
         except Exception as e:
-            messagebox.showerror("Error", f"Resize failed: {str(e)}")
+            self.report_error(f"Resize failed: {str(e)}")
             return False
         
 
+    @instrumented("apply_grayscale")
     def apply_grayscale(self):
         """Apply grayscale filter to the loaded image"""
         try:
-            if self.current_image is None:
+            if not self.has_image():
                 raise ValueError("No image loaded")
             
-            self.undo_stack.append(self.current_image.copy())
-            self.current_image = cv2.cvtColor(self.current_image, cv2.COLOR_BGR2GRAY)
-            if len(self.current_image.shape) == 2:
-                self.current_image = cv2.cvtColor(self.current_image, cv2.COLOR_GRAY2BGR)
+            self.record(("grayscale",))
+            return True
+        except Exception as e:
+            self.report_error(f"Grayscale failed: {str(e)}")
+            return False
+
+    def tone_operation(self, brightness=0, contrast=1.0, gamma=1.0, black=0, white=255):
+        """Validated ("tone", "adjust", ...) operation; neutral values leave the image unchanged"""
+        if not -255 <= brightness <= 255:
+            raise ValueError("Brightness must be between -255 and 255")
+        if not 0 <= contrast <= 10:
+            raise ValueError("Contrast must be between 0 and 10")
+        if not 0.05 <= gamma <= 10:
+            raise ValueError("Gamma must be between 0.05 and 10")
+        if not 0 <= black < white <= 255:
+            raise ValueError("Levels need 0 <= black < white <= 255")
+        return ("tone", "adjust", (float(brightness), float(contrast), float(gamma), int(black), int(white)))
+
+    @instrumented("adjust_tone")
+    def adjust_tone(self, brightness=0, contrast=1.0, gamma=1.0, black=0, white=255):
+        """Brightness, contrast, gamma and levels as one lookup table"""
+        try:
+            if not self.has_image():
+                raise ValueError("No image loaded")
+            self.record(self.tone_operation(brightness, contrast, gamma, black, white))
+            return True
+        except Exception as e:
+            self.report_error(f"Tone adjustment failed: {str(e)}")
+            return False
+
+    @instrumented("apply_curve")
+    def apply_curve(self, points):
+        """Tone curve through (input, output) control points"""
+        try:
+            if not self.has_image():
+                raise ValueError("No image loaded")
+            points = tuple((int(a), int(b)) for a, b in points)
+            if len(points) < 2 or not all(0 <= v <= 255 for point in points for v in point):
+                raise ValueError("A curve needs at least two points between 0 and 255")
+            self.record(("tone", "curves", points))
             return True
         except Exception as e:
-            messagebox.showerror("Error", f"Grayscale failed: {str(e)}")
+            self.report_error(f"Curve failed: {str(e)}")
             return False
 
-    def save_image(self, file_path):
-        """Save current image to specified path and handling error here"""
+    @instrumented("save_image")
+    def save_image(self, file_path, quality=95, compression=3, progressive=False, progress=None):
+        """Save current image to specified path and handling error here
+
+        quality and progressive apply to JPEG, compression (0-9) to PNG. The file is
+        written to a temporary name next to the target and renamed into place, so a
+        crash never leaves a half-written image. progress(stage, fraction) is called
+        as the save advances.
+        """
+        report = progress or (lambda stage, fraction: None)
         try:
-            if self.current_image is None:
+            if not self.has_image():
                 raise ValueError("No image to save")
-            if not file_path.lower().endswith(('.png', '.jpg', '.jpeg')):
+            ext = os.path.splitext(file_path)[1].lower()
+            if ext not in ('.png', '.jpg', '.jpeg'):
                 raise ValueError("Unsupported save format")
-            
-            cv2.imwrite(file_path, self.current_image)
+            if ext == '.png':
+                if not 0 <= compression <= 9:
+                    raise ValueError("PNG compression must be between 0 and 9")
+                params = [cv2.IMWRITE_PNG_COMPRESSION, int(compression)]
+            else:
+                if not 1 <= quality <= 100:
+                    raise ValueError("JPEG quality must be between 1 and 100")
+                params = [cv2.IMWRITE_JPEG_QUALITY, int(quality), cv2.IMWRITE_JPEG_PROGRESSIVE, int(progressive)]
+
+            # This is the only place the pipeline has to run at full resolution
+            report("rendering", 0.0)
+            image = self.current_image
+            report("encoding", 0.3)
+            ok, encoded = cv2.imencode(ext, image, params)
+            if not ok:
+                raise ValueError("Failed to encode image")
+
+            data = encoded.tobytes()
+            partial = f"{file_path}.{uuid.uuid4().hex}.partial"
+            try:
+                with open(partial, "wb") as handle:
+                    chunk = 4 * 1024 * 1024
+                    for offset in range(0, len(data), chunk):
+                        handle.write(data[offset:offset + chunk])
+                        report("writing", 0.8 + 0.2 * min(1.0, (offset + chunk) / len(data)))
+                os.replace(partial, file_path)
+            finally:
+                if os.path.exists(partial):
+                    os.remove(partial)
+            report("done", 1.0)
+            return True
+        except Exception as e:
+            self.report_error(f"Save failed: {str(e)}")
+            return False
+
+    @staticmethod
+    def session_name(file_path):
+        return hashlib.sha1(os.path.abspath(file_path).encode()).hexdigest()
+
+    @classmethod
+    def session_paths(cls, file_path, generation=None):
+        """Files of the saved session for a source image: the state, and the working buffer
+        and preview of one generation of edits"""
+        name = cls.session_name(file_path)
+        paths = {"state.json": SESSION_DIR / f"{name}.state.json"}
+        if generation is not None:
+            paths.update({kind: SESSION_DIR / f"{name}.{generation}.{kind}" for kind in ("working.npy", "preview.npy")})
+        return paths
+
+    def session_generation(self):
+        """Hash of the source and the operations, i.e. of the pixels the session arrays hold"""
+        return hashlib.sha1(json.dumps([file_key(self.source_path), self.operations]).encode()).hexdigest()[:16]
+
+    def save_session(self, working=False):
+        """Persist the operation history and the preview; with working, the full-resolution result too
+
+        The arrays are named after their generation and written before the state file
+        that names them, so a state is never paired with the pixels of other edits.
+        An image without edits has nothing to restore, so its session is removed instead.
+        """
+        try:
+            if self.source_path is None:
+                return False
+            if not self.operations and not self.redo_operations:
+                self.discard_session(self.source_path)
+                return True
+
+            generation = self.session_generation()
+            paths = self.session_paths(self.source_path, generation)
+            arrays = [("preview.npy", lambda: self.preview_image(self.preview_size))]
+            if working:
+                arrays.append(("working.npy", lambda: self.current_image))
+            for kind, image in arrays:
+                # Same generation, same pixels: an array already written need not be written again
+                if not paths[kind].is_file() and not self.write_cache(paths[kind], image(), SESSION_BYTES):
+                    raise OSError(f"could not write {paths[kind].name}")
+            state = {
+                "source_path": os.path.abspath(self.source_path),
+                "source_hash": hashlib.sha1(file_key(self.source_path).encode()).hexdigest(),
+                "source_size": list(self.source_size),
+                "source_gray": self.source_gray,
+                "operations": self.operations,
+                "redo_operations": self.redo_operations,
+                "generation": generation,
+                "working": paths["working.npy"].is_file(),
+                "saved": time.time(),
+            }
+            partial = paths["state.json"].with_suffix(f".{uuid.uuid4().hex}.partial")
+            partial.write_text(json.dumps(state))
+            os.replace(partial, paths["state.json"])
+
+            # Arrays of earlier generations are no longer named by any state
+            for path in SESSION_DIR.glob(f"{self.session_name(self.source_path)}.*.npy"):
+                if path not in (paths["working.npy"], paths["preview.npy"]):
+                    path.unlink(missing_ok=True)
+            return True
+        except Exception as e:
+            self.report_error(f"Saving session failed: {str(e)}")
+            return False
+
+    def restore_session(self, file_path):
+        """Reopen a saved session for the file without decoding it: the preview is shown as is and
+        the full-resolution result, when the session has one, is memory-mapped
+
+        Returns False when there is no usable session, e.g. the source changed since it was
+        saved or the arrays do not have the size its edits produce.
+        """
+        previous = (self.source_path, self.source_size, self.source_gray, self.source, self.original_pyramid,
+                    self.operations, self.redo_operations, self.rendered, self.previews, self.load_stats)
+        try:
+            state_path = self.session_paths(file_path)["state.json"]
+            if not state_path.is_file():
+                return False
+            state = json.loads(state_path.read_text())
+            if state["source_hash"] != hashlib.sha1(file_key(file_path).encode()).hexdigest():
+                self.discard_session(file_path)
+                return False
+            paths = self.session_paths(file_path, state["generation"])
+            if not paths["preview.npy"].is_file():
+                return False
+
+            start = time.perf_counter()
+            self.source_path = file_path
+            self.source_size = tuple(state["source_size"])
+            self.source_gray = state["source_gray"]
+            self.source = SourceImage(functools.partial(self.load_full, file_path, self.source_gray))
+            self.original_pyramid = None
+            self.set_operations(as_tuples(state["operations"]), as_tuples(state["redo_operations"]))
+            if self.session_generation() != state["generation"]:
+                raise LookupError
+            preview = np.load(paths["preview.npy"])
+            if preview.shape[1::-1] != self.fitted_size(self.preview_size):
+                raise LookupError
+            self.previews[self.preview_size] = preview
+            if state["working"] and paths["working.npy"].is_file():
+                rendered = np.load(paths["working.npy"], mmap_mode="r")
+                if rendered.shape[1::-1] != self.current_size():
+                    raise LookupError
+                self.rendered = rendered
+            self.load_stats = {"open_mode": "session", "first_pixel_seconds": time.perf_counter() - start,
+                               "resident_bytes": resident_memory()}
+
+            # Touch the files so eviction sees the session as recently used
+            for path in paths.values():
+                if path.is_file():
+                    os.utime(path)
             return True
         except Exception as e:
-            messagebox.showerror("Error", f"Save failed: {str(e)}")
+            (self.source_path, self.source_size, self.source_gray, self.source, self.original_pyramid,
+             self.operations, self.redo_operations, self.rendered, self.previews, self.load_stats) = previous
+            if isinstance(e, LookupError):
+                # The arrays belong to other edits than the state (e.g. a crash between writes)
+                self.discard_session(file_path)
+            else:
+                self.report_error(f"Restoring session failed: {str(e)}")
             return False
 
+    @classmethod
+    def discard_session(cls, file_path):
+        for path in SESSION_DIR.glob(f"{cls.session_name(file_path)}.*"):
+            path.unlink(missing_ok=True)
+
+    def snapshot(self):
+        """Independent copy of the current edit state, safe to render on another thread
+
+        The source and its pyramid are shared, so whatever the copy decodes stays
+        available to this processor too.
+        """
+        clone = copy.copy(self)
+        clone.operations = list(self.operations)
+        clone.redo_operations = list(self.redo_operations)
+        clone.previews = dict(self.previews)
+        clone.load_stats = {}
+        clone.report_error = raise_error
+        return clone
+
+    @instrumented("undo")
     def undo(self):
         """Revert to previous image state if the user intends"""
-        if self.undo_stack:
-            self.current_image = self.undo_stack.pop()
-            return True
-        return False
+        if not self.operations:
+            return False
+        self.set_operations(self.operations[:-1], self.redo_operations + self.operations[-1:])
+        return True
+
+    @instrumented("redo")
+    def redo(self):
+        """Re-apply the last undone change"""
+        if not self.redo_operations:
+            return False
+        self.set_operations(self.operations + self.redo_operations[-1:], self.redo_operations[:-1])
+        return True
+
+    def history_usage(self):
+        """Number of recorded operations and bytes of cached results held in memory"""
+        cached = [self.rendered] + list(self.previews.values())
+        if self.original_pyramid is not None:
+            cached += [level for index, level in self.original_pyramid.levels.items() if index > 0]
+        return {
+            "operations": len(self.operations) + len(self.redo_operations),
+            "memory": sum(image.nbytes for image in cached if image is not None),
+        }
+
+
+def make_thumbnail(file_path, size=128):
+    """Small BGR thumbnail, decoded at reduced resolution where the format allows it"""
+    image = None
+    if file_path.lower().endswith(('.jpg', '.jpeg')):
+        image = cv2.imread(file_path, cv2.IMREAD_REDUCED_COLOR_8)
+    if image is None:
+        image = cv2.imread(file_path, cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError(f"Failed to load {file_path}")
+    h, w = image.shape[:2]
+    scale = min(size / w, size / h, 1.0)
+    return cv2.resize(image, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+
+
+def prefetch_preview(file_path):
+    """Open an image once in the background so its reduced-resolution preview is cached"""
+    ImageProcessor(report_error=raise_error).load_image(file_path)
+
+
+class ThumbnailCache:
+    """Persistent thumbnails in one SQLite file, keyed by path, mtime and size, evicted least recently used first
+
+    Hits are only written back when a thumbnail's last use is older than touch_after
+    seconds, and then in batches of touch_batch, so showing cached thumbnails is not
+    a disk write each. The byte total is kept in memory rather than summed per insert.
+    """
+    def __init__(self, path=None, max_bytes=256 * 1024 ** 2, size=128, touch_after=60, touch_batch=32):
+        THUMBNAIL_DIR.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.size = size
+        self.touch_after = touch_after
+        self.touch_batch = touch_batch
+        self.touched = {}  # key -> last use not yet written
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(str(path or THUMBNAIL_DIR / "thumbnails.sqlite"), check_same_thread=False,
+                                  isolation_level=None)
+        self.db.execute("CREATE TABLE IF NOT EXISTS thumbnails "
+                        "(key TEXT PRIMARY KEY, data BLOB NOT NULL, nbytes INTEGER NOT NULL, last_used REAL NOT NULL)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS thumbnails_last_used ON thumbnails (last_used)")
+        self.total = self.db.execute("SELECT COALESCE(SUM(nbytes), 0) FROM thumbnails").fetchone()[0]
+
+    def get(self, file_path):
+        """Cached thumbnail for the file as it is now, or None"""
+        key = file_key(file_path)
+        with self.lock:
+            row = self.db.execute("SELECT data, last_used FROM thumbnails WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            now = time.time()
+            if now - row[1] > self.touch_after:
+                self.touched[key] = now
+                if len(self.touched) >= self.touch_batch:
+                    self.flush()
+        return cv2.imdecode(np.frombuffer(row[0], np.uint8), cv2.IMREAD_COLOR)
+
+    def flush(self):
+        """Write the pending last-use times in one transaction (caller holds the lock)"""
+        if not self.touched:
+            return
+        self.db.execute("BEGIN")
+        self.db.executemany("UPDATE thumbnails SET last_used = ? WHERE key = ?",
+                            [(used, key) for key, used in self.touched.items()])
+        self.db.execute("COMMIT")
+        self.touched = {}
+
+    def close(self):
+        with self.lock:
+            self.flush()
+            self.db.close()
+
+    def put(self, file_path, thumbnail):
+        ok, encoded = cv2.imencode(".jpg", thumbnail, [cv2.IMWRITE_JPEG_QUALITY, 85])
+        if not ok:
+            return
+        data = encoded.tobytes()
+        key = file_key(file_path)
+        with self.lock:
+            self.flush()  # eviction order needs the recent uses
+            self.db.execute("BEGIN")
+            old = self.db.execute("SELECT nbytes FROM thumbnails WHERE key = ?", (key,)).fetchone()
+            self.db.execute("INSERT OR REPLACE INTO thumbnails VALUES (?, ?, ?, ?)", (key, data, len(data), time.time()))
+            self.total += len(data) - (old[0] if old else 0)
+            self.evict()
+            self.db.execute("COMMIT")
+
+    def evict(self):
+        """Drop least recently used thumbnails until the total fits max_bytes (caller holds the lock)"""
+        if self.total <= self.max_bytes:
+            return
+        doomed = []
+        for key, nbytes in self.db.execute("SELECT key, nbytes FROM thumbnails ORDER BY last_used"):
+            if self.total <= self.max_bytes:
+                break
+            doomed.append((key,))
+            self.total -= nbytes
+        self.db.executemany("DELETE FROM thumbnails WHERE key = ?", doomed)
+
+    def thumbnail(self, file_path):
+        """Thumbnail from the cache, generating and storing it on a miss"""
+        thumbnail = self.get(file_path)
+        if thumbnail is None:
+            thumbnail = make_thumbnail(file_path, self.size)
+            self.put(file_path, thumbnail)
+        return thumbnail
+
+
+class SaveQueue:
+    """Saves snapshots one at a time on a background thread, reporting progress through a queue"""
+    def __init__(self):
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.events = queue.Queue()
+        self.pending = 0
+
+    def submit(self, processor, file_path, **options):
+        """Queue a save of the processor's current state; later edits do not affect it"""
+        snapshot = processor.snapshot()
+        self.pending += 1
+
+        def job():
+            def progress(stage, fraction):
+                self.events.put(("progress", file_path, stage, fraction))
+            try:
+                snapshot.save_image(file_path, progress=progress, **options)
+                self.events.put(("done", file_path, None, 1.0))
+            except Exception as e:
+                self.events.put(("failed", file_path, str(e), 1.0))
+
+        self.executor.submit(job)
+
+    def poll(self):
+        """Events since the last poll as (kind, path, detail, fraction)"""
+        events = []
+        while True:
+            try:
+                event = self.events.get_nowait()
+            except queue.Empty:
+                return events
+            if event[0] in ("done", "failed"):
+                self.pending -= 1
+            events.append(event)
 
 
 class ImageDisplay:
-     """Handles image display and canvas operations"""
-    def __init__(self, canvas):
+    """Handles image display and canvas operations
+
+    Image point (x, y) is drawn at canvas point (x * scale - view_x, y * scale - view_y).
+    With zoom=None the whole image is fitted into max_display_size; otherwise only the
+    tiles covering the canvas are rendered, from the pyramid level closest to the zoom.
+    """
+    def __init__(self, canvas, photo_factory=ImageTk.PhotoImage, report_error=show_error,
+                 tile_size=256, max_tiles=128):
         self.canvas = canvas
+        self.photo_factory = photo_factory  # stand-ins let the display path run without Tk
+        self.report_error = report_error
         self.photo = None
         self.display_image = None
+        self.pyramid = None
         self.max_display_size = 600
 
-    def update_display(self, image):
-        """View the new image"""
+        # Viewport state: scale is display pixels per image pixel
+        self.zoom = None
+        self.scale = 1.0
+        self.view_x = 0
+        self.view_y = 0
+        self.image_size = None
+        self.source_scale = 1.0
+        self.tile_size = tile_size
+        self.max_tiles = max_tiles
+        self.tiles = OrderedDict()  # (scale, tx, ty) -> PhotoImage, least recently used first
+        self.tile_items = {}
+
+    def profile_size(self):
+        if self.zoom is not None:
+            return self.viewport_size()
+        return self.display_image.size if self.display_image is not None else None
+
+    @instrumented("update_display")
+    def update_display(self, image, full_size=None):
+        """View the new image, reusing its preview pyramid while the image is unchanged
+
+        full_size is the (width, height) the pixels stand for, e.g. a preview of a larger image.
+        """
         try:
             if image is None:
                 raise ValueError("No image to display")
-            
-            # Calculate display size while maintaining aspect ratio
+            if self.pyramid is None or self.pyramid.source is not image:
+                self.pyramid = PreviewPyramid(image)
+                self.clear_tiles()
             h, w = image.shape[:2]
-            scale = min(self.max_display_size/w, self.max_display_size/h)
-            display_size = (int(w * scale), int(h * scale))
-            
-            # Resize and convert for display
-            display_img = cv2.resize(image, display_size)
-            display_img = cv2.cvtColor(display_img, cv2.COLOR_BGR2RGB)
-            self.display_image = Image.fromarray(display_img)
-            self.photo = ImageTk.PhotoImage(self.display_image)
-            
-            # Update the view for the image
-            self.canvas.delete("all")
-            self.canvas.create_image(0, 0, image=self.photo, anchor="nw")
-            self.canvas.config(width=display_size[0], height=display_size[1])
+            self.image_size = full_size or (w, h)
+            self.source_scale = w / self.image_size[0]
+
+            if self.zoom is None:
+                # Take the nearest pyramid level, already converted to RGB
+                self.scale = self.fit_scale(*self.image_size)
+                self.view_x = self.view_y = 0
+                self.show(self.pyramid.render(self.fit_size(*self.image_size)), self.fit_size(*self.image_size))
+            else:
+                self.scale = self.zoom
+                self.draw_tiles()
         except Exception as e:
-            messagebox.showerror("Error", f"Display failed: {str(e)}")
+            self.report_error(f"Display failed: {str(e)}")
+
+    def fit_scale(self, w, h):
+        return min(self.max_display_size/w, self.max_display_size/h)
+
+    def fit_size(self, w, h):
+        """Calculate display size while maintaining aspect ratio"""
+        scale = self.fit_scale(w, h)
+        return (max(1, int(w * scale)), max(1, int(h * scale)))
+
+    def show(self, display_image, display_size):
+        """Put a PIL image on the canvas, rebuilding the PhotoImage only when it changed"""
+        if display_image is not self.display_image:
+            self.display_image = display_image
+            self.photo = self.photo_factory(self.display_image)
+
+        # Update the view for the image
+        self.canvas.delete("all")
+        self.tile_items = {}
+        self.canvas.create_image(0, 0, image=self.photo, anchor="nw")
+        self.canvas.config(width=display_size[0], height=display_size[1])
+
+    def canvas_to_image(self, x, y):
+        """Image coordinates of a canvas point; the one transform cropping and zooming share"""
+        return (x + self.view_x) / self.scale, (y + self.view_y) / self.scale
+
+    def image_to_canvas(self, x, y):
+        return x * self.scale - self.view_x, y * self.scale - self.view_y
+
+    def viewport_size(self):
+        w, h = self.canvas.winfo_width(), self.canvas.winfo_height()
+        if w <= 1 or h <= 1:  # not mapped yet
+            return self.max_display_size, self.max_display_size
+        return w, h
+
+    def set_zoom(self, zoom, anchor=None):
+        """Switch to zoom display pixels per image pixel (None fits the image), keeping the image point under anchor still
+
+        The caller redraws afterwards, since a zoomed view wants full-resolution pixels.
+        """
+        if self.image_size is None:
+            return
+        view_w, view_h = self.viewport_size()
+        anchor_x, anchor_y = anchor or (view_w / 2, view_h / 2)
+        image_x, image_y = self.canvas_to_image(anchor_x, anchor_y)
+        if (zoom is None) != (self.zoom is None):
+            self.canvas.delete("all")
+            self.tile_items = {}
+            self.display_image = None
+        self.zoom = zoom
+        if zoom is not None:
+            self.scale = zoom
+            self.view_x = int(round(image_x * zoom - anchor_x))
+            self.view_y = int(round(image_y * zoom - anchor_y))
+
+    def pan(self, dx, dy):
+        """Move the zoomed view by a canvas offset"""
+        if self.zoom is not None and self.pyramid is not None:
+            self.view_x -= int(dx)
+            self.view_y -= int(dy)
+            self.draw_tiles()
+
+    def clear_tiles(self):
+        self.canvas.delete("tile")
+        self.tile_items = {}
+        self.tiles.clear()
+
+    def clamp_view(self, view_w, view_h):
+        """Keep the view on the image, centring it along an axis where it is smaller than the canvas"""
+        for axis, view, image in (("x", view_w, self.image_size[0]), ("y", view_h, self.image_size[1])):
+            zoomed = int(image * self.scale)
+            offset = getattr(self, f"view_{axis}")
+            if zoomed <= view:
+                offset = -((view - zoomed) // 2)
+            else:
+                offset = max(0, min(offset, zoomed - view))
+            setattr(self, f"view_{axis}", offset)
+
+    def draw_tiles(self):
+        """Place the tiles covering the canvas, rendering only the ones not already cached"""
+        view_w, view_h = self.viewport_size()
+        self.clamp_view(view_w, view_h)
+        t = self.tile_size
+        zoomed_w, zoomed_h = int(self.image_size[0] * self.scale), int(self.image_size[1] * self.scale)
+        visible = set()
+        for ty in range(max(0, self.view_y // t), min(-(-(self.view_y + view_h) // t), -(-zoomed_h // t))):
+            for tx in range(max(0, self.view_x // t), min(-(-(self.view_x + view_w) // t), -(-zoomed_w // t))):
+                key = (self.scale, tx, ty)
+                if key in self.tiles:
+                    self.tiles.move_to_end(key)
+                else:
+                    self.tiles[key] = self.photo_factory(self.render_tile(tx, ty))
+                    if len(self.tiles) > self.max_tiles:
+                        self.tiles.popitem(last=False)
+                visible.add(key)
+
+                # Panning only moves the existing canvas items
+                x, y = tx * t - self.view_x, ty * t - self.view_y
+                if key in self.tile_items:
+                    self.canvas.coords(self.tile_items[key], x, y)
+                else:
+                    self.tile_items[key] = self.canvas.create_image(x, y, image=self.tiles[key], anchor="nw",
+                                                                    tags="tile")
+        for key in list(self.tile_items):
+            if key not in visible:
+                self.canvas.delete(self.tile_items.pop(key))
+
+    def render_tile(self, tx, ty):
+        """PIL image of one tile of the zoomed view, sampled from only the level pixels beneath it"""
+        t = self.tile_size
+        tile_w = min(t, int(self.image_size[0] * self.scale) - tx * t)
+        tile_h = min(t, int(self.image_size[1] * self.scale) - ty * t)
+
+        # Coarsest level that is still at least as dense as the display
+        density = self.source_scale / self.scale
+        index = 0
+        while index + 1 < self.pyramid.count and density >= 2 ** (index + 1):
+            index += 1
+        level = self.pyramid.level(index)
+        step = density / 2 ** index  # level pixels per display pixel
+
+        # Map display pixel centres to level pixel centres, reading a patch just big enough
+        x0, y0 = tx * t * step, ty * t * step
+        left, top = int(x0), int(y0)
+        right = min(level.shape[1], int(np.ceil(x0 + tile_w * step)) + 1)
+        bottom = min(level.shape[0], int(np.ceil(y0 + tile_h * step)) + 1)
+        patch = level[top:bottom, left:right]
+        matrix = np.float32([[step, 0, x0 - left + (step - 1) / 2],
+                             [0, step, y0 - top + (step - 1) / 2]])
+        tile = cv2.warpAffine(patch, matrix, (tile_w, tile_h),
+                              flags=(cv2.INTER_NEAREST if step <= 1 else cv2.INTER_LINEAR) | cv2.WARP_INVERSE_MAP,
+                              borderMode=cv2.BORDER_REPLICATE)
+        return Image.fromarray(cv2.cvtColor(tile, cv2.COLOR_GRAY2RGB if tile.ndim == 2 else cv2.COLOR_BGR2RGB))
 
     def draw_rectangle(self, start_x, start_y, current_x, current_y, rect_id):
         """Draw cropping rectangle on image"""
@@ -162,26 +1282,65 @@ class ImageDisplay:
         )
 
 class ImageEditorApp: 
-     """Main application class coordinating UI and image processing."""
+    """Main application class coordinating UI and image processing."""
     def __init__(self, root):
         self.root = root
         self.root.title("Image Editor")
         self.root.geometry("1200x800")
         
-        self.image_processor = ImageProcessor()
+        self.image_processor = ImageProcessor(raw_cache_pixels=RAW_CACHE_PIXELS)
         self.start_x = None
         self.start_y = None
         self.rect_id = None
         self.cropping = False
+
+        # Slider resizes: proxy while dragging, full quality on a worker once it settles
+        self.resize_delay = 150
+        self.resize_poll_interval = 30
+        self.resize_after_id = None
+        self.resize_executor = ThreadPoolExecutor(max_workers=1)
+        self.resize_future = None
+        self.resize_generation = 0
+        self.resize_results = queue.Queue()
+        self.resize_polling = False
+        self.full_render = None  # (source, operations, future) of the zoomed view's full-resolution job
+
+        self.save_queue = SaveQueue()
+        self.save_poll_interval = 100
+
+        # Folder browsing: thumbnails come from a persistent cache, generated on a thread pool
+        self.folder_files = []
+        self.folder_index = 0
+        self.filmstrip_span = 7
+        self.thumbnail_size = 96
+        self.thumbnail_cache = ThumbnailCache(size=self.thumbnail_size)
+        self.thumbnail_executor = ThreadPoolExecutor(max_workers=min(4, os.cpu_count() or 1))
+        self.thumbnail_futures = {}
+        self.thumbnail_photos = {}
+        self.thumbnail_results = queue.Queue()
+        self.thumbnail_polling = False
+
+        # Sessions are saved in the background a little after each edit, and once more on close
+        self.session_interval = 2000
+        self.session_executor = ThreadPoolExecutor(max_workers=1)
+        self.session_future = None
+        self.session_saved = None
         
         self.setup_ui()
         self.bind_shortcuts()
+        self.root.protocol("WM_DELETE_WINDOW", self.close)
+        self.root.after(self.session_interval, self.autosave_session)
 
     def setup_ui(self):
         """Set up the main UI components."""
         self.main_frame = ttk.Frame(self.root)
         self.main_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
 
+        # Filmstrip of the open folder along the bottom
+        self.filmstrip = tk.Canvas(self.main_frame, height=self.thumbnail_size + 20, bg="#333333",
+                                   highlightthickness=0)
+        self.filmstrip.pack(side=tk.BOTTOM, fill=tk.X, pady=(10, 0))
+
         # Canvas for image display
         self.canvas = tk.Canvas(self.main_frame, bg="gray")
         self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
@@ -193,9 +1352,19 @@ class ImageEditorApp:
 
         # Buttons
         ttk.Button(self.control_frame, text="Load Image (Ctrl+O)", command=self.load_image).pack(fill=tk.X, pady=5)
+        ttk.Button(self.control_frame, text="Open Folder", command=self.open_folder).pack(fill=tk.X, pady=5)
         ttk.Button(self.control_frame, text="Save Image (Ctrl+S)", command=self.save_image).pack(fill=tk.X, pady=5)
         ttk.Button(self.control_frame, text="Grayscale", command=self.apply_grayscale).pack(fill=tk.X, pady=5)
         ttk.Button(self.control_frame, text="Undo (Ctrl+Z)", command=self.undo).pack(fill=tk.X, pady=5)
+        ttk.Button(self.control_frame, text="Redo (Ctrl+Y)", command=self.redo).pack(fill=tk.X, pady=5)
+
+        # Zoom: wheel zooms at the cursor, right or middle drag pans
+        zoom_frame = ttk.Frame(self.control_frame)
+        zoom_frame.pack(fill=tk.X, pady=5)
+        ttk.Button(zoom_frame, text="Fit (Ctrl+0)", command=lambda: self.set_zoom(None)).pack(side=tk.LEFT,
+                                                                                           expand=True, fill=tk.X)
+        ttk.Button(zoom_frame, text="100% (Ctrl+1)", command=lambda: self.set_zoom(1.0)).pack(side=tk.LEFT,
+                                                                                            expand=True, fill=tk.X)
 
         # Resize slider
         ttk.Label(self.control_frame, text="Resize Scale").pack(pady=5)
@@ -204,26 +1373,331 @@ class ImageEditorApp:
                              variable=self.scale_var, command=self.resize_image)
         self.scale.pack(fill=tk.X, pady=5)
 
+        # Tone sliders only touch the preview until "Apply Tone" records the adjustment
+        self.tone_vars = {}
+        for name, label, low, high, neutral in (("brightness", "Brightness", -100, 100, 0),
+                                                 ("contrast", "Contrast", 0.5, 2.0, 1.0),
+                                                 ("gamma", "Gamma", 0.3, 3.0, 1.0),
+                                                 ("black", "Levels Black", 0, 254, 0),
+                                                 ("white", "Levels White", 1, 255, 255)):
+            ttk.Label(self.control_frame, text=label).pack()
+            self.tone_vars[name] = tk.DoubleVar(value=neutral)
+            ttk.Scale(self.control_frame, from_=low, to=high, orient=tk.HORIZONTAL,
+                      variable=self.tone_vars[name], command=self.preview_tone).pack(fill=tk.X)
+        ttk.Button(self.control_frame, text="Apply Tone", command=self.apply_tone).pack(fill=tk.X, pady=(5, 0))
+        ttk.Button(self.control_frame, text="Reset Tone", command=self.reset_tone).pack(fill=tk.X, pady=5)
+
+        # Encoder options and save progress
+        ttk.Label(self.control_frame, text="JPEG quality").pack(pady=(10, 0))
+        self.quality_var = tk.IntVar(value=95)
+        ttk.Spinbox(self.control_frame, from_=1, to=100, textvariable=self.quality_var).pack(fill=tk.X)
+        ttk.Label(self.control_frame, text="PNG compression").pack(pady=(5, 0))
+        self.compression_var = tk.IntVar(value=3)
+        ttk.Spinbox(self.control_frame, from_=0, to=9, textvariable=self.compression_var).pack(fill=tk.X)
+        self.progressive_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(self.control_frame, text="Progressive JPEG", variable=self.progressive_var).pack(anchor=tk.W, pady=5)
+        self.save_progress = ttk.Progressbar(self.control_frame, maximum=100)
+        self.save_progress.pack(fill=tk.X, pady=5)
+
+        # Status line (load timings, save progress and memory)
+        self.status_var = tk.StringVar(value="")
+        ttk.Label(self.control_frame, textvariable=self.status_var, wraplength=200).pack(fill=tk.X, pady=5)
+
+        # Performance panel, hidden until toggled; showing it turns profiling on
+        self.profile_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(self.control_frame, text="Performance panel", variable=self.profile_var,
+                        command=self.toggle_profiler).pack(anchor=tk.W, pady=5)
+        self.profile_frame = ttk.Frame(self.control_frame)
+        self.profile_text = tk.Text(self.profile_frame, width=34, height=10, font=("Courier", 8))
+        self.profile_text.pack(fill=tk.X)
+        ttk.Button(self.profile_frame, text="Export JSON",
+                   command=lambda: self.export_profile(".json")).pack(side=tk.LEFT, expand=True, fill=tk.X)
+        ttk.Button(self.profile_frame, text="Export CSV",
+                   command=lambda: self.export_profile(".csv")).pack(side=tk.LEFT, expand=True, fill=tk.X)
+        if PROFILER.enabled:
+            self.profile_var.set(True)
+            self.toggle_profiler()
+
         # Canvas bindings for cropping
         self.canvas.bind("<ButtonPress-1>", self.start_crop)
         self.canvas.bind("<B1-Motion>", self.draw_crop)
         self.canvas.bind("<ButtonRelease-1>", self.end_crop)
 
+        # Canvas bindings for zooming and panning
+        self.canvas.bind("<MouseWheel>", lambda event: self.wheel_zoom(event, event.delta > 0))
+        self.canvas.bind("<Button-4>", lambda event: self.wheel_zoom(event, True))
+        self.canvas.bind("<Button-5>", lambda event: self.wheel_zoom(event, False))
+        for button in (2, 3):
+            self.canvas.bind(f"<ButtonPress-{button}>", self.start_pan)
+            self.canvas.bind(f"<B{button}-Motion>", self.drag_pan)
+        self.canvas.bind("<Configure>", lambda event: self.image_display.zoom is not None and self.refresh_display())
+
     def bind_shortcuts(self):
         """Bind keyboard shortcuts."""
         self.root.bind("<Control-z>", lambda event: self.undo())
+        self.root.bind("<Control-y>", lambda event: self.redo())
         self.root.bind("<Control-o>", lambda event: self.load_image())
         self.root.bind("<Control-s>", lambda event: self.save_image())
+        self.root.bind("<Prior>", lambda event: self.step_folder(-1))
+        self.root.bind("<Control-Key-0>", lambda event: self.set_zoom(None))
+        self.root.bind("<Control-Key-1>", lambda event: self.set_zoom(1.0))
+        self.root.bind("<Next>", lambda event: self.step_folder(1))
+
+    def open_folder(self):
+        """Pick a folder and show its images in the filmstrip."""
+        folder = filedialog.askdirectory()
+        if not folder:
+            return
+        self.folder_files = sorted(str(path) for path in Path(folder).iterdir()
+                                   if path.is_file() and path.suffix.lower() in IMAGE_EXTENSIONS)
+        if not self.folder_files:
+            messagebox.showerror("Error", "No images in this folder")
+            return
+        self.open_folder_image(0)
+
+    def step_folder(self, step):
+        """Move to the previous or next image of the folder."""
+        if self.folder_files:
+            self.open_folder_image(max(0, min(len(self.folder_files) - 1, self.folder_index + step)))
+
+    def open_folder_image(self, index):
+        """Open one image of the folder and warm the previews of its neighbours."""
+        self.folder_index = index
+        if self.open_image(self.folder_files[index]):
+            self.refresh_display()
+            self.show_load_stats()
+        for neighbour in (index + 1, index - 1):
+            if 0 <= neighbour < len(self.folder_files):
+                self.thumbnail_executor.submit(prefetch_preview, self.folder_files[neighbour])
+        self.draw_filmstrip()
+
+    def draw_filmstrip(self):
+        """Draw the thumbnails around the current image, requesting any that are not loaded yet."""
+        first = max(0, self.folder_index - self.filmstrip_span)
+        visible = self.folder_files[first:self.folder_index + self.filmstrip_span + 1]
+
+        # Only visible thumbnails are kept or generated, so huge folders cost the same as small ones
+        self.thumbnail_photos = {path: photo for path, photo in self.thumbnail_photos.items() if path in visible}
+        for path, future in list(self.thumbnail_futures.items()):
+            if path not in visible:
+                future.cancel()
+                del self.thumbnail_futures[path]
+
+        self.filmstrip.delete("all")
+        step = self.thumbnail_size + 10
+        for offset, path in enumerate(visible):
+            index = first + offset
+            x = 10 + offset * step
+            if index == self.folder_index:
+                self.filmstrip.create_rectangle(x - 3, 7, x + self.thumbnail_size + 3, self.thumbnail_size + 13,
+                                                outline="red", width=2)
+            if path in self.thumbnail_photos:
+                item = self.filmstrip.create_image(x + self.thumbnail_size // 2, 10 + self.thumbnail_size // 2,
+                                                   image=self.thumbnail_photos[path])
+            else:
+                item = self.filmstrip.create_rectangle(x, 10, x + self.thumbnail_size, 10 + self.thumbnail_size,
+                                                       fill="#555555", outline="")
+                if path not in self.thumbnail_futures:
+                    future = self.thumbnail_executor.submit(self.thumbnail_cache.thumbnail, path)
+                    future.add_done_callback(lambda future, path=path: self.thumbnail_results.put((path, future)))
+                    self.thumbnail_futures[path] = future
+            self.filmstrip.tag_bind(item, "<Button-1>", lambda event, index=index: self.open_folder_image(index))
+        if self.thumbnail_futures and not self.thumbnail_polling:
+            self.thumbnail_polling = True
+            self.root.after(50, self.poll_thumbnails)
+
+    def poll_thumbnails(self):
+        """Turn finished thumbnails into PhotoImages on the Tk thread."""
+        updated = False
+        while True:
+            try:
+                path, future = self.thumbnail_results.get_nowait()
+            except queue.Empty:
+                break
+            if self.thumbnail_futures.get(path) is not future or future.cancelled():
+                continue
+            del self.thumbnail_futures[path]
+            try:
+                thumbnail = future.result()
+            except Exception:
+                continue  # unreadable files simply keep their placeholder
+            rgb = cv2.cvtColor(thumbnail, cv2.COLOR_BGR2RGB)
+            self.thumbnail_photos[path] = ImageTk.PhotoImage(Image.fromarray(rgb))
+            updated = True
+        if updated:
+            self.draw_filmstrip()
+        if self.thumbnail_futures:
+            self.root.after(50, self.poll_thumbnails)
+        else:
+            self.thumbnail_polling = False
+
+    def toggle_profiler(self):
+        """Show or hide the performance panel, switching profiling with it."""
+        if self.profile_var.get():
+            if not PROFILER.enabled:
+                PROFILER.enable()
+            self.profile_frame.pack(fill=tk.X, pady=5)
+            self.update_profile_panel()
+        else:
+            PROFILER.disable()
+            self.profile_frame.pack_forget()
+
+    def update_profile_panel(self):
+        """Refresh the per-operation timings while the panel is visible."""
+        if not self.profile_var.get():
+            return
+        lines = [f"{'operation':<16}{'n':>4}{'mean':>7}{'p95':>7} ms"]
+        for row in PROFILER.summary():
+            lines.append(f"{row['operation'][:16]:<16}{row['count']:>4}"
+                         f"{row['mean'] * 1000:>7.1f}{row['p95'] * 1000:>7.1f}")
+        self.profile_text.delete("1.0", tk.END)
+        self.profile_text.insert(tk.END, "\n".join(lines))
+        self.root.after(500, self.update_profile_panel)
+
+    def export_profile(self, ext):
+        """Write the recorded timings to JSON or CSV for offline analysis."""
+        file_path = filedialog.asksaveasfilename(defaultextension=ext, filetypes=[(ext[1:].upper() + " files", "*" + ext)])
+        if not file_path:
+            return
+        try:
+            if ext == ".csv":
+                PROFILER.export_csv(file_path)
+            else:
+                PROFILER.export_json(file_path)
+        except OSError as e:
+            messagebox.showerror("Error", f"Export failed: {str(e)}")
+
+    def refresh_display(self):
+        """Redraw the canvas from the cached preview, or from full-resolution pixels when zoomed in.
+
+        The full-resolution result is rendered on the worker; until it arrives the zoomed
+        tiles are drawn from the preview.
+        """
+        processor = self.image_processor
+        size = processor.current_size()
+        zoom = self.image_display.zoom
+        zoomed_in = zoom is not None and zoom > self.image_display.fit_scale(*size)
+        if zoomed_in and processor.rendered is not None:
+            self.image_display.update_display(processor.rendered)
+            return
+        self.image_display.update_display(processor.preview_image(self.image_display.max_display_size), size)
+        if zoomed_in:
+            self.start_full_render_job()
+
+    def start_full_render_job(self):
+        """Render the current pipeline at full resolution on the worker, unless that job is already running."""
+        source = self.image_processor.source_pyramid()
+        operations = list(self.image_processor.operations)
+        polling = self.full_render is not None
+        if polling:
+            if self.full_render[:2] == (source, operations):
+                return
+            self.full_render[2].cancel()
+        future = self.resize_executor.submit(self.image_processor.snapshot().render)
+        self.full_render = (source, operations, future)
+        if not polling:
+            self.root.after(self.resize_poll_interval, self.poll_full_render)
+
+    def poll_full_render(self):
+        """Show the full-resolution result on the Tk thread once it is done, if it is still wanted."""
+        if self.full_render is None:
+            return
+        source, operations, future = self.full_render
+        if not future.done():
+            self.root.after(self.resize_poll_interval, self.poll_full_render)
+            return
+        self.full_render = None
+        if future.cancelled() or source is not self.image_processor.source_pyramid():
+            return
+        try:
+            rendered = future.result()
+        except Exception as e:
+            messagebox.showerror("Error", f"Render failed: {str(e)}")
+            return
+        self.image_processor.store_rendered(operations, rendered)
+        if self.image_processor.rendered is rendered:
+            self.refresh_display()
+
+    def set_zoom(self, zoom, anchor=None):
+        """Zoom to display pixels per image pixel, or fit the window with None."""
+        if not self.image_processor.has_image():
+            return
+        self.image_display.set_zoom(zoom, anchor)
+        self.refresh_display()
+
+    def wheel_zoom(self, event, zoom_in):
+        """Zoom in or out by a factor of 1.25 around the cursor."""
+        if not self.image_processor.has_image():
+            return
+        zoom = (self.image_display.zoom or self.image_display.scale) * (1.25 if zoom_in else 0.8)
+        self.set_zoom(min(max(zoom, 0.01), 16.0), (event.x, event.y))
+
+    def start_pan(self, event):
+        self.pan_x, self.pan_y = event.x, event.y
+
+    def drag_pan(self, event):
+        """Drag the zoomed view; only tiles that come into view are rendered."""
+        self.image_display.pan(event.x - self.pan_x, event.y - self.pan_y)
+        self.pan_x, self.pan_y = event.x, event.y
 
     def load_image(self):
         """Handle image loading with file dialog."""
         file_path = filedialog.askopenfilename(filetypes=[("Image files", "*.png *.jpg *.jpeg *.bmp")])
-        if file_path and self.image_processor.load_image(file_path):
-            self.image_display.update_display(self.image_processor.current_image)
+        if file_path and self.open_image(file_path):
+            self.refresh_display()
+            self.show_load_stats()
+
+    def open_image(self, file_path):
+        """Open a file, picking up its saved session (edits and history) when there is one."""
+        self.wait_for_session()
+        restored = self.image_processor.restore_session(file_path)
+        if not restored and not self.image_processor.load_image(file_path):
+            return False
+        self.session_saved = self.session_state()
+        return True
+
+    def session_state(self):
+        processor = self.image_processor
+        return processor.source_path, list(processor.operations), list(processor.redo_operations)
+
+    def autosave_session(self):
+        """Save the session on a worker once the edits have changed and the last save finished."""
+        if (self.image_processor.has_image() and self.session_state() != self.session_saved
+                and (self.session_future is None or self.session_future.done())):
+            self.session_saved = self.session_state()
+            # Only the state and preview: the full-resolution buffer is left for close()
+            self.session_future = self.session_executor.submit(self.image_processor.snapshot().save_session)
+        self.root.after(self.session_interval, self.autosave_session)
+
+    def wait_for_session(self):
+        if self.session_future is not None:
+            try:
+                self.session_future.result()
+            except Exception:
+                pass  # an incomplete session is simply not restored
+            self.session_future = None
+
+    def close(self):
+        """Save the session one last time, with the full-resolution result, then quit."""
+        self.wait_for_session()
+        if self.image_processor.has_image():
+            self.image_processor.save_session(working=True)
+        self.thumbnail_executor.shutdown(cancel_futures=True)
+        self.thumbnail_cache.close()
+        self.root.destroy()
+
+    def show_load_stats(self):
+        """Report time-to-first-pixel and resident memory of the last load."""
+        stats = self.image_processor.load_stats
+        resident = stats.get("resident_bytes")
+        self.status_var.set(
+            f"Opened ({stats.get('open_mode')}) in {stats['first_pixel_seconds'] * 1000:.0f} ms"
+            + (f", {resident / 1e6:.0f} MB resident" if resident else "")
+        )
 
     def start_crop(self, event):
         """Start cropping operation."""
-        if self.image_processor.current_image is None:
+        if not self.image_processor.has_image():
             return
         self.start_x = self.canvas.canvasx(event.x)
         self.start_y = self.canvas.canvasy(event.y)
@@ -250,18 +1724,12 @@ class ImageEditorApp:
         current_y = self.canvas.canvasy(event.y)
 
         try:
-            # Convert canvas coordinates to image coordinates
-            h, w = self.image_processor.current_image.shape[:2]
-            canvas_w, canvas_h = self.canvas.winfo_width(), self.canvas.winfo_height()
-            scale = min(canvas_w/w, canvas_h/h)
-            
-            x1 = int(min(self.start_x, current_x) / scale)
-            y1 = int(min(self.start_y, current_y) / scale)
-            x2 = int(max(self.start_x, current_x) / scale)
-            y2 = int(max(self.start_y, current_y) / scale)
+            # Convert canvas coordinates to image coordinates with the display's own transform
+            x1, y1 = self.image_display.canvas_to_image(self.start_x, self.start_y)
+            x2, y2 = self.image_display.canvas_to_image(current_x, current_y)
 
-            if self.image_processor.crop_image(x1, y1, x2, y2):
-                self.image_display.update_display(self.image_processor.current_image)
+            if self.image_processor.crop_image(int(round(x1)), int(round(y1)), int(round(x2)), int(round(y2))):
+                self.refresh_display()
         except Exception as e:
             messagebox.showerror("Error", f"Crop failed: {str(e)}")
         finally:
@@ -270,35 +1738,498 @@ class ImageEditorApp:
                 self.rect_id = None
 
     def resize_image(self, event=None):
-        """Handle image resizing from slider."""
-        if self.image_processor.resize_image(self.scale_var.get()):
-            self.image_display.update_display(self.image_processor.current_image)
+        """Handle image resizing from slider: show a proxy now, resize properly once the slider settles."""
+        if not self.image_processor.has_image():
+            return
+        try:
+            operations = self.image_processor.resize_operations(self.scale_var.get())
+            self.image_display.update_display(self.image_processor.preview_image(
+                self.image_display.max_display_size, operations, interpolation=cv2.INTER_NEAREST
+            ), self.image_processor.current_size(operations))
+        except Exception as e:
+            messagebox.showerror("Error", f"Resize failed: {str(e)}")
+            return
+
+        # Debounce: only the last motion event within resize_delay starts a job
+        if self.resize_after_id is not None:
+            self.root.after_cancel(self.resize_after_id)
+        self.resize_after_id = self.root.after(self.resize_delay, self.start_resize_job)
+
+    def start_resize_job(self):
+        """Render the high-quality preview on the worker thread, dropping any job that has not started yet."""
+        self.resize_after_id = None
+        scale = self.scale_var.get()
+        if not self.image_processor.has_image():
+            return
+        source = self.image_processor.source_pyramid()
+        if self.resize_future is not None:
+            self.resize_future.cancel()
+
+        self.resize_generation += 1
+        generation = self.resize_generation
+        operations = self.image_processor.resize_operations(scale)
+        max_size = self.image_display.max_display_size
+        # A snapshot shares the source and pyramid but none of the state load_image or edits rebind
+        snapshot = self.image_processor.snapshot()
+        self.resize_future = self.resize_executor.submit(snapshot.render, operations, max_size)
+        self.resize_future.add_done_callback(
+            lambda future: self.resize_results.put((generation, scale, source, operations, future))
+        )
+        if not self.resize_polling:
+            self.resize_polling = True
+            self.root.after(self.resize_poll_interval, self.poll_resize_results)
+
+    def poll_resize_results(self):
+        """Apply finished resizes on the Tk thread, ignoring stale ones."""
+        latest_done = False
+        while True:
+            try:
+                generation, scale, source, operations, future = self.resize_results.get_nowait()
+            except queue.Empty:
+                break
+            if generation != self.resize_generation:
+                continue
+            latest_done = True
+            if future.cancelled() or source is not self.image_processor.source_pyramid():
+                continue
+            try:
+                preview = future.result()
+            except Exception as e:
+                messagebox.showerror("Error", f"Resize failed: {str(e)}")
+                continue
+            if self.image_processor.resize_image(scale):
+                self.image_processor.store_preview(operations, self.image_display.max_display_size, preview)
+                self.refresh_display()
+
+        if latest_done:
+            self.resize_polling = False
+        else:
+            self.root.after(self.resize_poll_interval, self.poll_resize_results)
+
+    def tone_values(self):
+        """Current tone slider values as adjust_tone keyword arguments."""
+        values = {name: var.get() for name, var in self.tone_vars.items()}
+        values["black"], values["white"] = int(values["black"]), int(values["white"])
+        return values
+
+    def preview_tone(self, event=None):
+        """Show the tone sliders on the downscaled preview only."""
+        if not self.image_processor.has_image():
+            return
+        try:
+            operation = self.image_processor.tone_operation(**self.tone_values())
+        except ValueError:
+            return  # e.g. black dragged past white; keep the last valid preview
+        operations = self.image_processor.operations + [operation]
+        self.image_display.update_display(self.image_processor.preview_image(
+            self.image_display.max_display_size, operations
+        ), self.image_processor.current_size(operations))
+
+    def apply_tone(self):
+        """Record the tone adjustment; full resolution is only processed when saving."""
+        if self.image_processor.adjust_tone(**self.tone_values()):
+            self.reset_tone()
+
+    def reset_tone(self):
+        """Put the tone sliders back to neutral and show the recorded image."""
+        for name, neutral in (("brightness", 0), ("contrast", 1.0), ("gamma", 1.0), ("black", 0), ("white", 255)):
+            self.tone_vars[name].set(neutral)
+        if self.image_processor.has_image():
+            self.refresh_display()
 
     def apply_grayscale(self):
         """Apply grayscale filter and update display."""
         if self.image_processor.apply_grayscale():
-            self.image_display.update_display(self.image_processor.current_image)
+            self.refresh_display()
 
     def save_image(self):
-        """Handle image saving with file dialog."""
+        """Handle image saving with file dialog; the save runs in the background."""
+        if not self.image_processor.has_image():
+            messagebox.showerror("Error", "Save failed: No image to save")
+            return
         file_path = filedialog.asksaveasfilename(
             defaultextension=".png",
             filetypes=[("PNG files", "*.png"), ("JPEG files", "*.jpg")]
         )
-        if file_path:
-            self.image_processor.save_image(file_path)
+        if not file_path:
+            return
+        try:
+            options = dict(quality=self.quality_var.get(), compression=self.compression_var.get(),
+                           progressive=self.progressive_var.get())
+        except tk.TclError:
+            messagebox.showerror("Error", "Save failed: Invalid encoder options")
+            return
+        self.save_queue.submit(self.image_processor, file_path, **options)
+        self.status_var.set(f"Saving {os.path.basename(file_path)}...")
+        if self.save_queue.pending == 1:
+            self.root.after(self.save_poll_interval, self.poll_saves)
+
+    def poll_saves(self):
+        """Show progress and completion of background saves."""
+        for kind, file_path, detail, fraction in self.save_queue.poll():
+            name = os.path.basename(file_path)
+            self.save_progress["value"] = fraction * 100
+            if kind == "progress":
+                self.status_var.set(f"Saving {name}: {detail}")
+            elif kind == "done":
+                self.status_var.set(f"Saved {name}")
+            else:
+                self.status_var.set(f"Save of {name} failed")
+                messagebox.showerror("Error", detail)
+        if self.save_queue.pending:
+            self.root.after(self.save_poll_interval, self.poll_saves)
 
     def undo(self):
         """Handle undo operation."""
         if self.image_processor.undo():
-            self.image_display.update_display(self.image_processor.current_image)
+            self.refresh_display()
+
+    def redo(self):
+        """Handle redo operation."""
+        if self.image_processor.redo():
+            self.refresh_display()
 
     def run(self):
         """Start the main application loop."""
         self.root.mainloop()
     #Complete Image Editor App
-    
+
+
+# ————————————————————— Headless batch processing —————————————————————
+# Usage: python -m Question1 batch INPUT_DIR OUTPUT_DIR --recipe recipe.json --workers 8
+#
+# A recipe is a JSON list of operations applied in order with the same ImageProcessor the editor uses:
+#   {"op": "crop", "box": [x1, y1, x2, y2]}         pixel bounds, or
+#   {"op": "crop", "relative": [x1, y1, x2, y2]}    fractions of the current size
+#   {"op": "resize", "scale": 0.5}
+#   {"op": "grayscale"}
+#   {"op": "tone", "brightness": 10, "contrast": 1.2, "gamma": 0.9, "black": 5, "white": 250}
+#   {"op": "curves", "points": [[0, 0], [128, 150], [255, 255]]}
+#   {"op": "save", "ext": ".jpg", "suffix": "_small", "quality": 90}   may appear more than once;
+#       quality, progressive (JPEG) and compression (PNG) are passed to ImageProcessor.save_image
+# A recipe without a save step saves once at the end, keeping the input extension where possible.
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp')
+
+
+def load_recipe(text):
+    """Parse a recipe from a JSON file path or an inline JSON string and check its steps"""
+    if Path(text).is_file():
+        text = Path(text).read_text()
+    recipe = json.loads(text)
+    if not isinstance(recipe, list):
+        raise ValueError("Recipe must be a list of operations")
+    for step in recipe:
+        if step.get("op") not in ("crop", "resize", "grayscale", "tone", "curves", "save"):
+            raise ValueError(f"Unknown recipe operation: {step.get('op')}")
+    if not any(step["op"] == "save" for step in recipe):
+        recipe.append({"op": "save"})
+    return recipe
+
+
+def recipe_outputs(recipe, source, input_dir, output_dir):
+    """Output paths of every save step for one source image, mirroring the input tree"""
+    relative = source.relative_to(input_dir)
+    outputs = []
+    for step in recipe:
+        if step["op"] == "save":
+            ext = step.get("ext") or (source.suffix if source.suffix.lower() != ".bmp" else ".png")
+            name = relative.stem + step.get("suffix", "") + ext
+            outputs.append(Path(output_dir) / relative.parent / name)
+    return outputs
+
+
+def batch_jobs(input_dir, output_dir, recipe, force=False):
+    """Yield (source, outputs) for every image under input_dir whose outputs are missing or older
+
+    The tree is walked one directory at a time, so the first jobs start before the rest is listed.
+    """
+    for directory, subdirectories, names in os.walk(input_dir):
+        subdirectories.sort()
+        for name in sorted(names):
+            source = Path(directory) / name
+            if source.suffix.lower() not in IMAGE_EXTENSIONS or not source.is_file():
+                continue
+            outputs = recipe_outputs(recipe, source, input_dir, output_dir)
+            mtime = source.stat().st_mtime
+            if not force and all(out.is_file() and out.stat().st_mtime >= mtime for out in outputs):
+                continue
+            yield source, outputs
+
+
+def batch_worker_init():
+    # Each process is one worker already, OpenCV's own threads would only compete with them
+    cv2.setNumThreads(1)
+
+
+def batch_process_one(job):
+    """Apply a recipe to one image in a worker process; returns (source, input bytes, seconds, error)"""
+    source, outputs, recipe = job
+    start = time.perf_counter()
+    try:
+        # Each image is read once, so a raw cache would only be extra disk writes
+        processor = ImageProcessor(report_error=raise_error, raw_cache_pixels=None)
+        processor.load_image(str(source), fast_open=False)
+        outputs = iter(outputs)
+        for step in recipe:
+            if step["op"] == "crop":
+                if "relative" in step:
+                    w, h = processor.current_size()
+                    x1, y1, x2, y2 = step["relative"]
+                    processor.crop_image(int(x1 * w), int(y1 * h), int(x2 * w), int(y2 * h))
+                else:
+                    processor.crop_image(*step["box"])
+            elif step["op"] == "resize":
+                processor.resize_image(float(step["scale"]))
+            elif step["op"] == "grayscale":
+                processor.apply_grayscale()
+            elif step["op"] == "tone":
+                processor.adjust_tone(**{key: step[key] for key in
+                                         ("brightness", "contrast", "gamma", "black", "white") if key in step})
+            elif step["op"] == "curves":
+                processor.apply_curve(step["points"])
+            elif step["op"] == "save":
+                output = next(outputs)
+                output.parent.mkdir(parents=True, exist_ok=True)
+                options = {key: step[key] for key in ("quality", "compression", "progressive") if key in step}
+                processor.save_image(str(output), **options)
+        return str(source), source.stat().st_size, time.perf_counter() - start, None
+    except Exception as e:
+        return str(source), 0, time.perf_counter() - start, str(e)
+
+
+def run_batch(input_dir, output_dir, recipe, workers=None, force=False, quiet=False):
+    """Process a directory tree across a process pool, streaming results; returns the failure count
+
+    Only a few jobs per worker are in flight at a time, and each result is reported as soon
+    as it finishes, so neither the tree walk nor one slow image holds back the output.
+    """
+    jobs = batch_jobs(input_dir, output_dir, recipe, force)
+    window = 4 * (workers or os.cpu_count() or 1)
+    done = failed = total_bytes = 0
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=batch_worker_init) as executor:
+        pending = set()
+        while True:
+            for source, outputs in itertools.islice(jobs, window - len(pending)):
+                pending.add(executor.submit(batch_process_one, (source, outputs, recipe)))
+            if not pending:
+                break
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                source, size, seconds, error = future.result()
+                done += 1
+                total_bytes += size
+                if error:
+                    failed += 1
+                    print(f"FAIL {source}: {error}", file=sys.stderr)
+                elif not quiet:
+                    print(f"ok   {source} ({seconds:.2f}s)", flush=True)
+
+    elapsed = max(time.perf_counter() - start, 1e-9)
+    print(f"{done} images ({failed} failed) in {elapsed:.1f}s: "
+          f"{done / elapsed:.1f} images/s, {total_bytes / elapsed / 1e6:.1f} MB/s")
+    return failed
+
+
+def batch_main(argv):
+    parser = argparse.ArgumentParser(prog="python -m Question1 batch",
+                                     description="Apply an editing recipe to a directory tree of images")
+    parser.add_argument("input_dir")
+    parser.add_argument("output_dir")
+    parser.add_argument("--recipe", required=True, help="JSON file or inline JSON list of operations")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="number of worker processes")
+    parser.add_argument("--force", action="store_true", help="reprocess images whose outputs are up to date")
+    parser.add_argument("--quiet", action="store_true", help="only print failures and the summary")
+    args = parser.parse_args(argv)
+    recipe = load_recipe(args.recipe)
+    failed = run_batch(args.input_dir, args.output_dir, recipe, args.workers, args.force, args.quiet)
+    return 1 if failed else 0
+
+
+
+# ————————————————————— Benchmarks —————————————————————
+# Usage: python -m Question1 bench --sizes 1 10 50 100 --output bench.json [--compare old.json]
+#
+# Times the editor's hot paths on synthetic images with the Tk widgets replaced by
+# stand-ins, records peak traced memory per case and writes JSON that can be
+# compared between commits.
+
+class HeadlessCanvas:
+    """Canvas stand-in that accepts the calls ImageDisplay makes and draws nothing"""
+    def delete(self, *args):
+        pass
+
+    def create_image(self, *args, **kwargs):
+        return 1
+
+    def create_rectangle(self, *args, **kwargs):
+        return 1
+
+    def config(self, **kwargs):
+        pass
+
+
+def headless_photo(image):
+    """PhotoImage stand-in; copying the pixels out approximates the cost of handing them to Tk"""
+    return image.tobytes()
+
+
+def synthetic_image(megapixels, seed=0):
+    """Smooth colour noise with fine grain, 4:3, roughly the given number of megapixels"""
+    w = int((megapixels * 1e6 * 4 / 3) ** 0.5)
+    h = int(w * 3 / 4)
+    rng = np.random.default_rng(seed)
+    coarse = rng.integers(0, 256, (h // 64 + 2, w // 64 + 2, 3), dtype=np.uint8)
+    image = cv2.resize(coarse, (w, h), interpolation=cv2.INTER_CUBIC)
+    return cv2.add(image, rng.integers(0, 16, (h, w, 3), dtype=np.uint8))
+
+
+def bench_cases(image, jpg_path, workdir):
+    """(name, setup) pairs; setup does the untimed preparation and returns the timed callable"""
+    def processor():
+        editor = ImageProcessor(report_error=raise_error)
+        editor.set_image(image)
+        return editor
+
+    def load(fast_open):
+        def setup():
+            editor = ImageProcessor(report_error=raise_error)
+            for kind in ("preview", "raw"):
+                editor.cache_path(jpg_path, kind).unlink(missing_ok=True)
+            if fast_open:
+                return lambda: editor.load_image(jpg_path) and editor.preview_image(600)
+            return lambda: editor.load_image(jpg_path, fast_open=False) and editor.current_image
+        return setup
+
+    def edit(apply):
+        def setup():
+            editor = processor()
+            return lambda: (apply(editor), editor.current_image, editor.preview_image(600))
+        return setup
+
+    def save(name, **options):
+        def setup():
+            editor = processor()
+            return lambda: editor.save_image(os.path.join(workdir, name), **options)
+        return setup
+
+    def display():
+        def setup():
+            view = ImageDisplay(HeadlessCanvas(), photo_factory=headless_photo, report_error=raise_error)
+            return lambda: view.update_display(image)
+        return setup
+
+    def refresh_after_edit():
+        def setup():
+            editor = processor()
+            view = ImageDisplay(HeadlessCanvas(), photo_factory=headless_photo, report_error=raise_error)
+            view.update_display(editor.preview_image(600))
+            w, h = editor.current_size()
+            return lambda: (editor.crop_image(w // 8, h // 8, w - w // 8, h - h // 8),
+                            view.update_display(editor.preview_image(600)))
+        return setup
+
+    h, w = image.shape[:2]
+    return [
+        ("load_image (fast open)", load(True)),
+        ("load_image (full)", load(False)),
+        ("crop_image", edit(lambda editor: editor.crop_image(w // 4, h // 4, w * 3 // 4, h * 3 // 4))),
+        ("resize_image", edit(lambda editor: editor.resize_image(0.5))),
+        ("apply_grayscale", edit(lambda editor: editor.apply_grayscale())),
+        ("save_image (png)", save("bench.png", compression=3)),
+        ("save_image (jpg)", save("bench.jpg", quality=95)),
+        ("update_display (full resolution)", display()),
+        ("crop + display refresh", refresh_after_edit()),
+    ]
+
+
+def run_benchmarks(sizes, repeat=3):
+    """Time every case at every size; returns the JSON-ready results"""
+    results = []
+    with tempfile.TemporaryDirectory(prefix="image_editor_bench_") as workdir:
+        for megapixels in sizes:
+            image = synthetic_image(megapixels)
+            jpg_path = os.path.join(workdir, f"source_{megapixels}mp.jpg")
+            cv2.imwrite(jpg_path, image, [cv2.IMWRITE_JPEG_QUALITY, 95])
+            for name, setup in bench_cases(image, jpg_path, workdir):
+                times = []
+                for _ in range(repeat):
+                    timed = setup()
+                    start = time.perf_counter()
+                    timed()
+                    times.append(time.perf_counter() - start)
+
+                # One more run under tracemalloc, kept apart so tracing does not skew the timings
+                timed = setup()
+                tracemalloc.start()
+                timed()
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+
+                result = {"case": name, "megapixels": megapixels, "shape": list(image.shape),
+                          "median_seconds": statistics.median(times), "min_seconds": min(times),
+                          "peak_bytes": peak}
+                results.append(result)
+                print(f"{megapixels:>6} MP  {name:<34} {result['median_seconds'] * 1000:>9.1f} ms"
+                      f"  peak {peak / 1e6:>8.1f} MB", flush=True)
+            del image
+    return results
+
+
+def compare_benchmarks(results, baseline, tolerance=0.2):
+    """Print time and memory ratios against a baseline run; returns the number of regressions"""
+    previous = {(entry["case"], entry["megapixels"]): entry for entry in baseline["results"]}
+    regressions = 0
+    for entry in results:
+        old = previous.get((entry["case"], entry["megapixels"]))
+        if old is None:
+            continue
+        time_ratio = entry["median_seconds"] / max(old["median_seconds"], 1e-9)
+        memory_ratio = entry["peak_bytes"] / max(old["peak_bytes"], 1)
+        regressed = time_ratio > 1 + tolerance or memory_ratio > 1 + tolerance
+        regressions += regressed
+        print(f"{'REGRESSION' if regressed else 'ok':<10} {entry['megapixels']:>6} MP  {entry['case']:<34}"
+              f" time x{time_ratio:.2f}  memory x{memory_ratio:.2f}")
+    return regressions
+
+
+def bench_main(argv):
+    parser = argparse.ArgumentParser(prog="python -m Question1 bench",
+                                     description="Benchmark the image editor's hot paths headlessly")
+    parser.add_argument("--sizes", type=float, nargs="+", default=[1, 10, 50, 100], help="image sizes in megapixels")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per case (the median is reported)")
+    parser.add_argument("--output", default="bench.json", help="where to write the JSON results")
+    parser.add_argument("--compare", help="earlier results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown or growth before flagging")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.sizes, args.repeat)
+    report = {
+        "python": platform.python_version(),
+        "opencv": cv2.__version__,
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "results": results,
+    }
+    with open(args.output, "w") as handle:
+        json.dump(report, handle, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as handle:
+            return 1 if compare_benchmarks(results, json.load(handle), args.tolerance) else 0
+    return 0
+
+
 if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "batch":
+        sys.exit(batch_main(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == "bench":
+        sys.exit(bench_main(sys.argv[2:]))
+    if "--profile" in sys.argv or "--profile-memory" in sys.argv:
+        PROFILER.enable(track_memory="--profile-memory" in sys.argv)
     try:
         root = tk.Tk()
         app = ImageEditorApp(root)
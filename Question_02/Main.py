@@ -1,73 +1,373 @@
 # Kindly make sure to pull the latest updates from Git 🙏
 
+import argparse
+import csv
+import json
 import os
+import struct
+import time
+import zlib
+from collections import OrderedDict, defaultdict, deque
+import numpy as np
 import pygame
 import random
 
-
-pygame.init()
-
-base = r"C:\Users\pgash\Desktop\CDU STUDY\SEM 01\Softwear Now\Asigment 02\Assignment_3\Question_02\assets"
+STARTED = time.perf_counter()
+
+parser = argparse.ArgumentParser(description="Blade of the Fallen")
+parser.add_argument("--bench-animation", action="store_true",
+                    help="run the facing microbenchmark without a window")
+parser.add_argument("--bench-collisions", action="store_true",
+                    help="time the collision broad-phase at 1k and 10k entities")
+parser.add_argument("--bench-scrolling", action="store_true",
+                    help="time drawing the scrolling world for levels of 10, 100 and 1000 screens")
+parser.add_argument("--stress", type=int, default=0, help="spawn N enemies per wave instead of one")
+parser.add_argument("--level-screens", type=int, default=20, help="level length in screen widths")
+parser.add_argument("--headless", action="store_true",
+                    help="run the simulation only, as fast as possible, with seeded randomness")
+parser.add_argument("--ticks", type=int, default=10000, help="ticks to simulate in headless mode")
+parser.add_argument("--seed", type=int, default=None,
+                    help="random seed (headless mode defaults to 0, the window to a fresh one)")
+parser.add_argument("--record", metavar="PATH", help="record the seed and per-tick keys to PATH")
+parser.add_argument("--replay", metavar="PATH",
+                    help="replay a recording (windowed, or as fast as possible with --headless) and time it")
+parser.add_argument("--profile-csv", metavar="PATH",
+                    help="write the frame profiler's per-phase timings to PATH on exit")
+parser.add_argument("--build-assets", action="store_true",
+                    help="rebuild the frame bundle, then report cold and warm startup times")
+
+base = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets")
 
 # ————————————————————— Setup —————————————————————
-pygame.display.set_caption("Blade of the Fallen")
 SCREEN_W, SCREEN_H = 800, 400
-screen = pygame.display.set_mode((SCREEN_W, SCREEN_H))
-clock = pygame.time.Clock()
 
-# Ground tile  
-floor_tile = pygame.image.load(
-    os.path.join(base, "backgrounds", "Floor_01.png")
-).convert_alpha()
+# The simulation always advances in fixed steps; rendering interpolates between the last two
+TICK_RATE = 60
+TICK_MS = 1000 / TICK_RATE
+MAX_CATCH_UP = 5  # ticks per frame at most, so a long stall can't snowball
 
-tile_width  = floor_tile.get_width()
-tile_height = floor_tile.get_height()
-ground_y    = SCREEN_H - tile_height   # position floor at the bottom
+surfaces_made = 0  # surfaces created by the game while running, read by the frame profiler
 
 
+def counted(surface):
+    """Count a surface the game just created, for the profiler's surfaces per frame, and return it."""
+    global surfaces_made
+    surfaces_made += 1
+    return surface
 
-# ————————————————————— Helpers —————————————————————
+# ————————————————————— Assets —————————————————————
 FRAME_W, FRAME_H = 80, 80
 SCALE = 1.5
 
-def load_animation(path, num_frames):
-    """Load & slice a horizontal spritesheet into scaled frames."""
-    sheet = pygame.image.load(path).convert_alpha()
-    frames = []
-    for i in range(num_frames):
-        rect = pygame.Rect(i * FRAME_W, 0, FRAME_W, FRAME_H)
-        frame = sheet.subsurface(rect)
-        frame = pygame.transform.scale(frame,
-            (int(FRAME_W * SCALE), int(FRAME_H * SCALE))
-        )
-        frames.append(frame)
-    return frames
-
-# ———————————————————— Load Assets ————————————————————
-
-tree_img = pygame.image.load(os.path.join(base, "backgrounds", "Tree_01.png")).convert_alpha()
+class AnimationSet:
+    """Frames of one animation facing right and the same frames mirrored, baked once at load."""
+    def __init__(self, right, left):
+        self.right = right
+        self.left = left
+
+    def frames(self, facing_right):
+        return self.right if facing_right else self.left
+
+    def __len__(self):
+        return len(self.right)
+
+
+# Every animation the game can use: group -> name -> (sheet, frames, frame width, frame height, scale).
+# frames=None takes the whole sheet; a frame width of None means the image is one frame.
+# Enemy groups are only read from the bundle when that enemy type first spawns.
+ANIMATIONS = {
+    "player": {
+        "idle":   ("player/idle_sheet.png",      18, FRAME_W, FRAME_H, SCALE),
+        "run":    ("player/run_sheet.png",        8, FRAME_W, FRAME_H, SCALE),
+        "jump":   ("player/jump_sheet.png",       4, FRAME_W, FRAME_H, SCALE),
+        "attack": ("player/light_atk_sheet.png",  6, FRAME_W, FRAME_H, SCALE),
+        "death":  ("player/death.png",            3, FRAME_W, FRAME_H, SCALE),
+    },
+    "Flying_eye": {
+        "sprite":     ("enemies/Flying_eye/Flight2.png",           1, None, None, 1),
+        "flight":     ("enemies/Flying_eye/Flight.png",            8, 150, 150, 1),
+        "attack":     ("enemies/Flying_eye/Attack.png",            2, 150, 150, 1),
+        "death":      ("enemies/Flying_eye/Death.png",             2, 150, 150, 1),
+        "take_hit":   ("enemies/Flying_eye/Take Hit.png",       None, 150, 150, 1),
+        "projectile": ("enemies/Flying_eye/projectile_sprite.png", 8, 48, 48, 1),
+    },
+    "Goblin": {
+        "attack3": ("enemies/Goblin/Attack3.png",     None, 150, 150, 1),
+        "bomb":    ("enemies/Goblin/Bomb_sprite.png", None, 100, 100, 1),
+    },
+    "Mushroom": {
+        "attack3":    ("enemies/Mushroom/Attack3.png",           None, 150, 150, 1),
+        "projectile": ("enemies/Mushroom/Projectile_sprite.png", None, 50, 50, 1),
+    },
+    "Skeleton": {
+        name: (f"enemies/Skeleton/{sheet}.png", None, 150, 150, 1)
+        for name, sheet in (("attack", "Attack"), ("attack3", "Attack3"), ("death", "Death"), ("idle", "Idle"),
+                            ("shield", "Shield"), ("take_hit", "Take Hit"), ("walk", "Walk"))
+    },
+    "witch": {
+        name: (f"enemies/witch/{sheet}.png", None, 250, 250, 1)
+        for name, sheet in (("attack1", "Attack1"), ("attack2", "Attack2"), ("death", "Death"), ("fall", "Fall"),
+                            ("idle", "Idle"), ("jump", "Jump"), ("run", "Run"), ("take_hit", "Take hit"))
+    },
+}
+BUNDLE_VERSION = 1
+
+
+class Assets:
+    """Loads every image file once and packs animation frames into a few shared atlas surfaces.
+
+    Animations come from a pre-baked bundle of already sliced and scaled RGBA frames,
+    rebuilt whenever a source sheet's mtime or the manifest (frame sizes, scale)
+    changes. Frames are subsurfaces of an atlas, so every sprite blit reads from one
+    of a handful of big textures.
+    """
+    def __init__(self, root, bundle_path=None, atlas_size=2048):
+        self.root = root
+        self.bundle_path = bundle_path or os.path.join(root, "frames.bundle")
+        self.atlas_size = atlas_size
+        self.images = {}        # path -> Surface, loaded from disk once
+        self.groups = {}        # group -> {name: AnimationSet}, read from the bundle on first use
+        self.atlases = []       # big surfaces holding every packed frame
+        self.frame_rects = {}   # (group, name) -> (right, left) lists of (atlas index, Rect)
+        self.shelf_x = self.shelf_y = self.shelf_h = 0
+        self.header = None      # bundle index, read once
+        self.load_stats = {}    # bundle state and milliseconds per step, for the startup report
+
+    def image(self, *parts):
+        path = os.path.join(self.root, *parts)
+        if path not in self.images:
+            self.images[path] = counted(pygame.image.load(path).convert_alpha())
+        return self.images[path]
+
+    def pack(self, surface):
+        """Copy a surface into the current atlas (shelf packing) and return the frame that views it."""
+        w, h = surface.get_size()
+        if self.shelf_x + w > self.atlas_size:
+            self.shelf_x, self.shelf_y, self.shelf_h = 0, self.shelf_y + self.shelf_h, 0
+        if not self.atlases or self.shelf_y + h > self.atlas_size:
+            self.atlases.append(counted(pygame.Surface((self.atlas_size, self.atlas_size),
+                                                       pygame.SRCALPHA).convert_alpha()))
+            self.shelf_x = self.shelf_y = self.shelf_h = 0
+        rect = pygame.Rect(self.shelf_x, self.shelf_y, w, h)
+        self.atlases[-1].blit(surface, rect)
+        self.shelf_x += w
+        self.shelf_h = max(self.shelf_h, h)
+        return len(self.atlases) - 1, rect
+
+    def sources(self):
+        """mtime of every sheet in the manifest; a bundle built from other mtimes is stale."""
+        return {sheet: os.stat(os.path.join(self.root, *sheet.split("/"))).st_mtime_ns
+                for group in ANIMATIONS.values() for sheet, *_ in group.values()}
+
+    def slice_sheet(self, sheet, num_frames, frame_w, frame_h, scale):
+        """Slice & scale a horizontal spritesheet into frames (the slow part the bundle saves)."""
+        image = counted(pygame.image.load(os.path.join(self.root, *sheet.split("/"))))
+        if frame_w is None:
+            frame_w, frame_h = image.get_size()
+        if num_frames is None:
+            num_frames = image.get_width() // frame_w
+        size = (int(frame_w * scale), int(frame_h * scale))
+        return [counted(pygame.transform.scale(image.subsurface(pygame.Rect(i * frame_w, 0, frame_w, frame_h)), size))
+                for i in range(num_frames)]
+
+    def build_bundle(self):
+        """Write every animation's frames as raw RGBA plus a JSON index to one file, atomically."""
+        start = time.perf_counter()
+        index, chunks, offset = {}, [], 0
+        for group, animations in ANIMATIONS.items():
+            index[group] = {}
+            for name, spec in animations.items():
+                frames = self.slice_sheet(*spec)
+                data = b"".join(pygame.image.tobytes(frame, "RGBA") for frame in frames)
+                index[group][name] = {"size": frames[0].get_size(), "frames": len(frames),
+                                      "offset": offset, "nbytes": len(data)}
+                chunks.append(data)
+                offset += len(data)
+        header = {"version": BUNDLE_VERSION, "manifest": ANIMATIONS, "sources": self.sources(), "index": index}
+        encoded = json.dumps(header).encode()
+
+        partial = f"{self.bundle_path}.{os.getpid()}.partial"
+        with open(partial, "wb") as handle:
+            handle.write(struct.pack("<Q", len(encoded)))
+            handle.write(encoded)
+            for data in chunks:
+                handle.write(data)
+        os.replace(partial, self.bundle_path)
+        self.load_stats["build_ms"] = (time.perf_counter() - start) * 1000
+        return header
+
+    def read_header(self):
+        with open(self.bundle_path, "rb") as handle:
+            size, = struct.unpack("<Q", handle.read(8))
+            header = json.loads(handle.read(size))
+        header["data_start"] = 8 + size
+        return header
+
+    def open_bundle(self):
+        """Read the bundle index, rebuilding the bundle first when it is missing or stale."""
+        if self.header is None:
+            start = time.perf_counter()
+            header = None
+            if os.path.exists(self.bundle_path):
+                header = self.read_header()
+                manifest = json.loads(json.dumps(ANIMATIONS))  # tuples compare as the lists JSON gives back
+                if (header.get("version") != BUNDLE_VERSION or header["manifest"] != manifest
+                        or header["sources"] != self.sources()):
+                    header = None
+            self.load_stats["bundle"] = "warm" if header is not None else "rebuilt"
+            if header is None:
+                self.build_bundle()
+                header = self.read_header()
+            self.header = header
+            self.load_stats["open_ms"] = (time.perf_counter() - start) * 1000
+        return self.header
+
+    def group(self, group):
+        """All animations of one group (the player or an enemy type), read from the bundle on first use."""
+        if group not in self.groups:
+            header = self.open_bundle()
+            start = time.perf_counter()
+            animations = {}
+            with open(self.bundle_path, "rb") as handle:
+                for name, entry in header["index"][group].items():
+                    handle.seek(header["data_start"] + entry["offset"])
+                    data = handle.read(entry["nbytes"])
+                    w, h = entry["size"]
+                    right, left = [], []
+                    for i in range(entry["frames"]):
+                        frame = counted(pygame.image.frombuffer(data[i * w * h * 4:(i + 1) * w * h * 4],
+                                                                (w, h), "RGBA"))
+                        right.append(self.pack(frame))
+                        left.append(self.pack(counted(pygame.transform.flip(frame, True, False))))
+                    self.frame_rects[group, name] = (right, left)
+                    animations[name] = AnimationSet(
+                        [counted(self.atlases[index].subsurface(rect)) for index, rect in right],
+                        [counted(self.atlases[index].subsurface(rect)) for index, rect in left],
+                    )
+            self.groups[group] = animations
+            self.load_stats[f"{group}_ms"] = (time.perf_counter() - start) * 1000
+        return self.groups[group]
+
+    def startup_report(self):
+        return ", ".join(f"{key} {value:.1f}" if isinstance(value, float) else f"{key} {value}"
+                         for key, value in self.load_stats.items())
+
+
+# ———————————————————— Level Assets ————————————————————
+# Props standing on the floor: name -> (path under assets, source rect in the sheet or None, weight)
+WOOD_CAMP = ("backgrounds", "Wood-Camp", "Tiles", "Assets.png")
+PROPS = {
+    "tree":   (("backgrounds", "Tree_01.png"), None, 6),
+    "tree2":  (("backgrounds", "Tree_02.png"), None, 6),
+    "bush":   (("backgrounds", "Bush_01.png"), None, 4),
+    "bush2":  (("backgrounds", "Bush_02.png"), None, 4),
+    "hedge":  (WOOD_CAMP, (229, 195, 182, 61), 2),
+    "tower":  (WOOD_CAMP, (467, 17, 108, 335), 1),
+    "crate":  (WOOD_CAMP, (4, 228, 40, 41), 2),
+    "stump":  (WOOD_CAMP, (5, 286, 56, 48), 2),
+    "barrel": (WOOD_CAMP, (147, 301, 42, 65), 2),
+    "chest":  (WOOD_CAMP, (4, 350, 56, 47), 1),
+    "rock":   (WOOD_CAMP, (96, 372, 77, 60), 2),
+    "mound":  (("backgrounds", "Final", "Tiles.png"), (160, 146, 160, 78), 1),
+    "column": (("backgrounds", "Final", "Tiles.png"), (163, 299, 26, 52), 1),
+}
+
+# Parallax layers, farthest first, with how fast each scrolls relative to the level
+PARALLAX_LAYERS = (("Bg_6th.png", 0.0), ("Bg_4th.png", 0.1), ("Bg_3rd.png", 0.2),
+                   ("Bg_2nd.png", 0.35), ("Bg_1st.png", 0.5))
+
+# Filled in by setup(), so importing this module opens no window and reads no assets
+screen = clock = assets = floor_tile = None
+tile_width = tile_height = ground_y = CHUNK_W = 0
+player_anims = idle_frames = run_frames = jump_frames = attack_frames = death_frames = None
+
+
+def setup(windowed=True):
+    """Start pygame, open the window (a dummy one unless windowed) and load what every mode needs."""
+    global screen, clock, assets, floor_tile, tile_width, tile_height, ground_y, CHUNK_W
+    global player_anims, idle_frames, run_frames, jump_frames, attack_frames, death_frames
+    if not windowed:
+        os.environ.setdefault("SDL_VIDEODRIVER", "dummy")  # no window needed
+    pygame.init()
+    pygame.display.set_caption("Blade of the Fallen")
+    screen = pygame.display.set_mode((SCREEN_W, SCREEN_H))
+    clock = pygame.time.Clock()
+    assets = Assets(base)
+
+    # Ground tile
+    floor_tile = assets.image("backgrounds", "Floor_01.png")
+    tile_width  = floor_tile.get_width()
+    tile_height = floor_tile.get_height()
+    ground_y    = SCREEN_H - tile_height   # position floor at the bottom
+    CHUNK_W = 4 * tile_width  # pre-rendered level slices, a whole number of floor tiles wide
+
+    # ———————————————————— Load Animations ————————————————————
+    player_anims  = assets.group("player")
+    idle_frames   = player_anims["idle"]
+    run_frames    = player_anims["run"]
+    jump_frames   = player_anims["jump"]
+    attack_frames = player_anims["attack"]
+    death_frames  = player_anims["death"]
+
+# ———————————————————— Text and HUD ————————————————————
+class TextCache:
+    """Fonts by (name, size, bold, italic) and rendered text by (text, colour, font), so drawing text is a lookup."""
+    def __init__(self, max_rendered=256):
+        self.fonts = {}
+        self.rendered = OrderedDict()  # least recently used first
+        self.max_rendered = max_rendered
+
+    def font(self, name, size, bold=False, italic=False):
+        key = (name, size, bold, italic)
+        if key not in self.fonts:
+            self.fonts[key] = pygame.font.SysFont(name, size, bold=bold, italic=italic)
+        return self.fonts[key]
+
+    def render(self, text, colour, name, size, bold=False, italic=False):
+        key = (text, colour, name, size, bold, italic)
+        if key in self.rendered:
+            self.rendered.move_to_end(key)
+            return self.rendered[key]
+        surface = counted(self.font(name, size, bold, italic).render(text, True, colour))
+        self.rendered[key] = surface
+        if len(self.rendered) > self.max_rendered:
+            self.rendered.popitem(last=False)
+        return surface
+
+
+text_cache = TextCache()
+
+
+class HudWidget:
+    """A HUD element whose surface is only re-rendered when the value it shows changes."""
+    def __init__(self, pos, render):
+        self.pos = pos
+        self.render = render  # value -> Surface
+        self.value = None
+        self.surface = None
+
+    def draw(self, surface, value):
+        if self.surface is None or value != self.value:
+            self.value = value
+            self.surface = self.render(value)
+        return surface.blit(self.surface, self.pos)
+
+
+def render_health_bar(fraction, width=150, height=20):
+    bar = counted(pygame.Surface((width, height), pygame.SRCALPHA))
+    pygame.draw.rect(bar, (255, 0, 0), (0, 0, fraction * width, height))  # Red fill
+    pygame.draw.rect(bar, (255, 255, 255), bar.get_rect(), 2)              # White border
+    return bar
 
 
-# ———————————————————— Load Animations ————————————————————
-
-idle_frames   = load_animation(os.path.join(base, "player", "idle_sheet.png"),    18)
-run_frames    = load_animation(os.path.join(base, "player", "run_sheet.png"),      8)
-jump_frames   = load_animation(os.path.join(base, "player", "jump_sheet.png"),     4)
-attack_frames = load_animation(os.path.join(base, "player", "light_atk_sheet.png"), 6)
-death_frames   = load_animation(os.path.join(base, "player", "death.png"),     3)
-
-# Load Flying Enemy Animations
-flying_base = os.path.join(base, "enemies", "Flying_eye")
-flying_fly_frames    = load_animation(os.path.join(flying_base, "Flight.png"), 8)
-flying_attack_frames = load_animation(os.path.join(flying_base, "Attack.png"), 2)
-flying_death_frames  = load_animation(os.path.join(flying_base, "Death.png"),  2)
-
 # ———————————————————— Player Class ————————————————————
 class Player:
-    def __init__(self):
+    def __init__(self, level_w=SCREEN_W):
+        self.level_w = level_w
         self.max_health = 100 # Player max health
         self.current_health = 100 # Player health
         self.dead = False
+        self.health_bar = HudWidget((10, 10), render_health_bar)
 
         # All animation frame lists already loaded elsewhere
         self.anims = {
@@ -100,10 +400,11 @@ class Player:
         # Starting image and position
         PLAYER_START_X = 100
         PLAYER_START_Y = 520   # ← tweak this value until she sits where you want
-        self.image = self.frames[self.idx]
+        self.image = self.frames.right[self.idx]
         self.rect = self.image.get_rect(topleft=(PLAYER_START_X, PLAYER_START_Y)
 
         )
+        self.prev_pos = self.rect.topleft  # position one tick ago, for interpolated drawing
 
 
         # Physics
@@ -150,11 +451,11 @@ class Player:
         # ensure current frame index is within new frame list
         self.idx %= len(self.frames)
         
-        # Prevent going out of the screen horizontally
+        # Prevent going out of the level horizontally
         if self.rect.left < 0:
             self.rect.left = 0
-        if self.rect.right > SCREEN_W:
-            self.rect.right = SCREEN_W
+        if self.rect.right > self.level_w:
+            self.rect.right = self.level_w
 
 
     def apply_gravity(self):
@@ -192,108 +493,497 @@ class Player:
                     # loop normally for idle/run/jump
                     self.idx = 0
 
-            self.image = self.frames[self.idx]
-            if not self.facing_right:
-                self.image = pygame.transform.flip(self.image, True, False)
+        # Facing only picks the pre-mirrored list, so nothing is allocated here
+        self.image = self.frames.frames(self.facing_right)[self.idx]
 
 
-    def draw(self, surf):
-        surf.blit(self.image, self.rect)
+    def attack_rect(self):
+        """Hitbox of the sword swing, in front of the player on the side she faces."""
+        box = pygame.Rect(0, 0, 60, self.rect.height // 2)
+        if self.facing_right:
+            box.midleft = self.rect.center
+        else:
+            box.midright = self.rect.center
+        return box
+
+    def draw(self, surf, alpha=1.0, scroll=0):
+        x = round(self.prev_pos[0] + (self.rect.x - self.prev_pos[0]) * alpha) - scroll
+        y = round(self.prev_pos[1] + (self.rect.y - self.prev_pos[1]) * alpha)
+        return surf.blit(self.image, (x, y))
         
     def draw_health_bar(self, surface):
-        bar_width = 150
-        bar_height = 20
-        fill = (self.current_health / self.max_health) * bar_width
-        border_rect = pygame.Rect(10, 10, bar_width, bar_height)
-        fill_rect = pygame.Rect(10, 10, fill, bar_height)
-
-        pygame.draw.rect(surface, (255, 0, 0), fill_rect)       # Red fill
-        pygame.draw.rect(surface, (255, 255, 255), border_rect, 2)  # White border
+        return self.health_bar.draw(surface, self.current_health / self.max_health)
 
         
         
         
-class FlyingEnemy:
-    def __init__(self, x, y, target):
-        self.image = pygame.image.load(os.path.join(base, "enemies", "Flying_eye", "Flight2.png")).convert_alpha()
-        self.rect = self.image.get_rect(topleft=(x, y))
-        self.target = target
-        self.dead = False
-        self.vel_x = -3
-
-    def update(self, dt):
-        self.rect.x += self.vel_x
-
-        # Track player vertically
-        if self.target.rect.centery > self.rect.centery:
-            self.rect.y += 1
-        elif self.target.rect.centery < self.rect.centery:
-            self.rect.y -= 1
-
-    def draw(self, surface):
-        surface.blit(self.image, self.rect)
-
-    def check_collision_with_player(self):
-        return self.rect.colliderect(self.target.rect)
-
-    def hit(self):
-        self.dead = True
-
-
-
-
-player = Player()
-enemies = []  # List to hold multiple enemies
-spawn_timer = 0
-spawn_interval = 2000  # Spawn every 2000 milliseconds (2 seconds)
-game_over = False
-
-# ————————————————————— Main Loop —————————————————————
-running = True
-
-while running:
-    dt = clock.tick(60)
-    screen.fill((50, 200, 255))
-    
-    # Example: draw 3 trees at fixed positions
-    screen.blit(tree_img, (-150, ground_y - tree_img.get_height()+ 10))  # Off-screen left
-    screen.blit(tree_img, (250, ground_y - tree_img.get_height()+ 10))
-    screen.blit(tree_img, (600, ground_y - tree_img.get_height()+ 10))
-
-    # Draw floor
-    for x in range(0, SCREEN_W, tile_width):
-        screen.blit(floor_tile, (x, ground_y))
-        
-    
-
-
-    # Event handling
-    for e in pygame.event.get():
-        if e.type == pygame.QUIT:
-            running = False
-    
-    spawn_timer += dt
-    if not player.dead and spawn_timer >= spawn_interval:
-        spawn_timer = 0
-        spawn_x = SCREEN_W + 50  # Start just off the right edge
-        spawn_y = random.randint(50, 200)  # Random vertical position
-        enemies.append(FlyingEnemy(spawn_x, spawn_y, player))
-
-
-    keys = pygame.key.get_pressed()
-    player.handle_input(keys)
-    player.apply_gravity()
-    player.update_animation(dt)
-    player.draw(screen)
-    player.draw_health_bar(screen)  # Draw health bar
-
-    # Update & draw enemy
-    for enemy in enemies[:]:
-        enemy.update(dt)
-        
-        if enemy.check_collision_with_player() and not enemy.dead:
-            enemy.hit()
-            player.current_health -= 10  # Deal damage
+class SpatialHash:
+    """Uniform grid over axis-aligned boxes, rebuilt each tick, for collision broad-phase.
+
+    Every box is listed under each cell it touches (sorted by cell key), so a query
+    only looks at boxes sharing a cell with it, not at all of them.
+    """
+    OFFSET = 1 << 20  # keeps cells of negative coordinates positive inside the key
+    STRIDE = 1 << 21
+    BRUTE_FORCE_BELOW = 64  # with this few boxes, testing all of them is cheaper than the grid
+
+    def __init__(self, cell_size=64):
+        self.cell_size = cell_size
+        self.keys = np.empty(0, np.int64)
+        self.owner = np.empty(0, np.int64)
+        self.boxes = (np.empty(0, np.int64),) * 4
+
+    def cells(self, x, y, w, h):
+        """Cell keys covered by each box, flattened, with the index of the box each key belongs to."""
+        c = self.cell_size
+        x0, y0 = x // c, y // c
+        span_x = (x + w - 1) // c - x0 + 1
+        span_y = (y + h - 1) // c - y0 + 1
+        counts = span_x * span_y
+        owner = np.repeat(np.arange(len(x)), counts)
+        offset = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        cx = x0[owner] + offset % span_x[owner]
+        cy = y0[owner] + offset // span_x[owner]
+        return (cx + self.OFFSET) * self.STRIDE + (cy + self.OFFSET), owner
+
+    def build(self, x, y, w, h):
+        x, y = np.asarray(x, np.int64), np.asarray(y, np.int64)
+        w, h = np.broadcast_to(np.asarray(w, np.int64), x.shape), np.broadcast_to(np.asarray(h, np.int64), x.shape)
+        self.boxes = (x, y, w, h)
+        if len(x) < self.BRUTE_FORCE_BELOW:
+            self.keys = None
+            return
+        keys, owner = self.cells(x, y, w, h)
+        order = np.argsort(keys, kind="stable")
+        self.keys, self.owner = keys[order], owner[order]
+
+    def pairs(self, x, y, w, h):
+        """(query index, box index) of every query box overlapping a built box, like Rect.colliderect."""
+        x, y = np.atleast_1d(np.asarray(x, np.int64)), np.atleast_1d(np.asarray(y, np.int64))
+        w, h = np.broadcast_to(np.asarray(w, np.int64), x.shape), np.broadcast_to(np.asarray(h, np.int64), x.shape)
+        n = len(self.boxes[0])
+        if n == 0:
+            return np.empty(0, np.int64), np.empty(0, np.int64)
+
+        if self.keys is None:
+            qi, bj = np.divmod(np.arange(len(x) * n), n)  # every pair
+        else:
+            # Candidates: every built box listed under a cell the query touches
+            keys, owner = self.cells(x, y, w, h)
+            lo = np.searchsorted(self.keys, keys, "left")
+            counts = np.searchsorted(self.keys, keys, "right") - lo
+            qi = np.repeat(owner, counts)
+            position = np.repeat(lo, counts) + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+            bj = self.owner[position]
+
+            # Pairs sharing several cells show up once per cell
+            unique = np.unique(qi * (n + 1) + bj)
+            qi, bj = unique // (n + 1), unique % (n + 1)
+
+        # Narrow phase on the candidates only
+        bx, by, bw, bh = (array[bj] for array in self.boxes)
+        hit = (x[qi] < bx + bw) & (bx < x[qi] + w[qi]) & (y[qi] < by + bh) & (by < y[qi] + h[qi])
+        return qi[hit], bj[hit]
+
+    def overlapping(self, rect):
+        """Indices of the built boxes overlapping one Rect."""
+        return self.pairs(rect.x, rect.y, rect.w, rect.h)[1]
+
+
+class EnemySwarm:
+    """All flying enemies (or projectiles) as NumPy arrays, updated in one batched step per frame.
+
+    Slots 0..count-1 are live; removing enemies compacts the arrays, so there are
+    no per-enemy objects and no list.remove. Coordinates stay integers like Rects.
+    """
+    def __init__(self, sprite, capacity=64, tracking=True):
+        self.sprite = sprite  # returns the image; only called at the first spawn
+        self.image = None
+        self.tracking = tracking  # projectiles fly straight
+        self.w = self.h = 0
+        self.x = np.zeros(capacity, np.int32)
+        self.y = np.zeros(capacity, np.int32)
+        self.prev_x = np.zeros(capacity, np.int32)  # positions one tick ago, for interpolated drawing
+        self.prev_y = np.zeros(capacity, np.int32)
+        self.vx = np.zeros(capacity, np.int32)
+        self.alive = np.zeros(capacity, bool)
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def load(self):
+        if self.image is None:
+            self.image = self.sprite()
+            self.w, self.h = self.image.get_size()
+
+    def spawn(self, x, y, vx=-3):
+        self.load()
+        if self.count == len(self.x):
+            # Grow by doubling so spawning stays amortised O(1)
+            for name in ("x", "y", "prev_x", "prev_y", "vx", "alive"):
+                old = getattr(self, name)
+                grown = np.zeros(len(old) * 2, old.dtype)
+                grown[:self.count] = old[:self.count]
+                setattr(self, name, grown)
+        i = self.count
+        self.x[i], self.y[i], self.vx[i], self.alive[i] = x, y, vx, True
+        self.prev_x[i], self.prev_y[i] = x, y
+        self.count += 1
+
+    def update(self, target_rect, right=None):
+        """One tick: move every enemy left of right (the rest wait off screen) and track the target vertically by 1px."""
+        n = self.count
+        self.prev_x[:n] = self.x[:n]
+        self.prev_y[:n] = self.y[:n]
+        awake = 1 if right is None else (self.x[:n] <= right).astype(np.int32)
+        self.x[:n] += self.vx[:n] * awake
+        if self.tracking:
+            self.y[:n] += np.sign(target_rect.centery - (self.y[:n] + self.h // 2)).astype(np.int32) * awake
+
+    def boxes(self):
+        n = self.count
+        return self.x[:n], self.y[:n], self.w, self.h
+
+    def kill(self, indices):
+        """Mark enemies dead and return how many of them were still alive."""
+        indices = np.unique(indices)
+        indices = indices[self.alive[indices]]
+        self.alive[indices] = False
+        return len(indices)
+
+    def cull(self, left=0):
+        """Drop dead enemies and those past the left edge of the view by compacting the arrays."""
+        n = self.count
+        keep = np.flatnonzero(self.alive[:n] & (self.x[:n] + self.w >= left))
+        if len(keep) == n:
+            return
+        for array in (self.x, self.y, self.prev_x, self.prev_y, self.vx, self.alive):
+            array[:len(keep)] = array[keep]
+        self.count = len(keep)
+
+    def draw(self, surface, alpha=1.0, scroll=0):
+        """Blit the enemies inside the view that starts at level x = scroll; returns their rects."""
+        n = self.count
+        x = np.rint(self.prev_x[:n] + (self.x[:n] - self.prev_x[:n]) * alpha).astype(np.int32) - scroll
+        y = np.rint(self.prev_y[:n] + (self.y[:n] - self.prev_y[:n]) * alpha).astype(np.int32)
+        visible = (x + self.w > 0) & (x < surface.get_width())
+        return surface.blits([(self.image, position) for position in zip(x[visible].tolist(), y[visible].tolist())],
+                             doreturn=True)
+
+
+def bench_animation(ticks=20000):
+    """Per-frame cost of facing left: flipping every frame (old) vs the pre-baked left frames."""
+    baked = {id(frame) for group in assets.groups.values() for anim in group.values()
+             for frame in anim.right + anim.left}
+    frame_bytes = run_frames.right[0].get_width() * run_frames.right[0].get_height() * 4
+
+    def flip_per_frame(player):
+        player.image = pygame.transform.flip(player.frames.right[player.idx], True, False)
+
+    def pre_baked(player):
+        player.update_animation(player.speed)
+
+    for name, tick in (("flip per frame", flip_per_frame), ("pre-baked", pre_baked)):
+        player = Player()
+        player.state, player.frames, player.speed = "run", player.anims["run"], player.state_speeds["run"]
+        player.facing_right = False
+        new_surfaces = 0
+        start = time.perf_counter()
+        for i in range(ticks):
+            player.idx = i % len(player.frames)
+            tick(player)
+            new_surfaces += id(player.image) not in baked
+        elapsed = time.perf_counter() - start
+        print(f"{name:15s} {elapsed / ticks * 1e6:7.2f} us/frame  "
+              f"{new_surfaces / ticks:.2f} new surfaces/frame  {new_surfaces * frame_bytes / ticks:8.0f} bytes/frame")
+
+
+def bench_collisions(sizes=(1000, 10000), cell_size=64):
+    """Many-versus-many collisions (half projectiles vs half enemies): spatial hash vs testing every pair."""
+    rng = np.random.default_rng(0)
+    for n in sizes:
+        # World grows with n so the density stays that of a busy screen
+        side = int((n * 40 * 40) ** 0.5)
+        ex, ey = rng.integers(0, side, n // 2), rng.integers(0, side, n // 2)
+        px, py = rng.integers(0, side, n // 2), rng.integers(0, side, n // 2)
+
+        hashed = float("inf")
+        for _ in range(5):  # best of 5, like a steady-state tick
+            start = time.perf_counter()
+            grid = SpatialHash(cell_size)
+            grid.build(ex, ey, 43, 30)
+            qi, bj = grid.pairs(px, py, 48, 48)
+            hashed = min(hashed, time.perf_counter() - start)
+
+        start = time.perf_counter()
+        enemy_rects = [pygame.Rect(int(x), int(y), 43, 30) for x, y in zip(ex, ey)]
+        brute = sum(len(pygame.Rect(int(x), int(y), 48, 48).collidelistall(enemy_rects)) for x, y in zip(px, py))
+        every_pair = time.perf_counter() - start
+
+        assert brute == len(qi)
+        print(f"{n:6d} entities  {len(qi):6d} hits  spatial hash {hashed * 1000:8.2f} ms  "
+              f"every pair {every_pair * 1000:9.2f} ms")
+
+
+def bench_scrolling(frames=2000, lengths=(10, 100, 1000)):
+    """Cost of drawing the scrolling world per frame, for ever longer levels."""
+    parallax = Parallax()
+    scenery = pygame.Surface((SCREEN_W, SCREEN_H)).convert()
+    for screens in lengths:
+        start = time.perf_counter()
+        level = TileMap(screens * SCREEN_W)
+        built = time.perf_counter() - start
+        scroll = level.width // 2
+        times = []
+        for i in range(frames):
+            scroll += 5 if i % 600 < 400 else -5  # run right, then back a little
+            start = time.perf_counter()
+            parallax.draw(scenery, scroll)
+            level.draw(scenery, scroll)
+            times.append(time.perf_counter() - start)
+        times.sort()
+        cached = sum(chunk.get_width() * chunk.get_height() * 4 for chunk in level.chunks.values())
+        print(f"{screens:5d} screens  built in {built * 1000:6.1f} ms  frame mean {sum(times) / frames * 1000:.3f} "
+              f"p99 {times[frames * 99 // 100] * 1000:.3f} ms  {level.rendered} chunks rendered, "
+              f"{cached / 1e6:.1f} MB cached (whole level {level.width * SCREEN_H * 4 / 1e6:.0f} MB)")
+
+
+class Camera:
+    """The part of the level on screen; follows the player and stops at the level ends."""
+    def __init__(self, level_w=SCREEN_W):
+        self.level_w = max(level_w, SCREEN_W)
+        self.rect = pygame.Rect(0, 0, SCREEN_W, SCREEN_H)
+        self.prev_x = 0  # scroll one tick ago, for interpolated drawing
+
+    def follow(self, target):
+        self.prev_x = self.rect.x
+        self.rect.centerx = target.centerx
+        self.rect.clamp_ip((0, 0, self.level_w, SCREEN_H))
+
+    def scroll(self, alpha=1.0):
+        return round(self.prev_x + (self.rect.x - self.prev_x) * alpha)
+
+
+class TileMap:
+    """The level floor and props, cut into CHUNK_W slices that are each pre-rendered once when first seen.
+
+    Only the chunks under the view are drawn, and a bounded LRU keeps the rendered
+    ones, so drawing and memory cost the same however long the level is.
+    """
+    def __init__(self, width, seed=0, max_chunks=8):
+        self.width = width
+        self.count = -(-width // CHUNK_W)
+        self.chunks = OrderedDict()  # chunk index -> Surface, least recently used first
+        self.max_chunks = max_chunks
+        self.rendered = 0
+        self.props = {}
+
+        # Lay the level out from its own seed, so it never moves the game's random numbers
+        rng = random.Random(seed)
+        self.placed = [[] for _ in range(self.count)]  # per chunk: (prop image, level x) touching it
+        names = list(PROPS)
+        weights = [PROPS[name][2] for name in names]
+        x = rng.randint(-150, 100)
+        while x < width:
+            image = self.prop(rng.choices(names, weights)[0])
+            for i in range(max(0, x // CHUNK_W), min(self.count, (x + image.get_width() - 1) // CHUNK_W + 1)):
+                self.placed[i].append((image, x))
+            x += rng.randint(120, 360)
+
+    def prop(self, name):
+        if name not in self.props:
+            parts, area, _ = PROPS[name]
+            image = assets.image(*parts)
+            self.props[name] = counted(image.subsurface(area)) if area else image
+        return self.props[name]
+
+    def chunk(self, i):
+        if i in self.chunks:
+            self.chunks.move_to_end(i)
+            return self.chunks[i]
+        left = i * CHUNK_W
+        surface = counted(pygame.Surface((CHUNK_W, SCREEN_H), pygame.SRCALPHA).convert_alpha())
+        for image, x in self.placed[i]:
+            surface.blit(image, (x - left, ground_y - image.get_height() + 10))
+        for x in range(0, CHUNK_W, tile_width):
+            surface.blit(floor_tile, (x, ground_y))
+        self.chunks[i] = surface
+        self.rendered += 1
+        if len(self.chunks) > self.max_chunks:
+            self.chunks.popitem(last=False)
+        return surface
+
+    def draw(self, surface, scroll):
+        for i in range(max(0, scroll // CHUNK_W), min(self.count, (scroll + SCREEN_W - 1) // CHUNK_W + 1)):
+            surface.blit(self.chunk(i), (i * CHUNK_W - scroll, 0))
+
+
+class Parallax:
+    """Background layers scrolling slower the farther away they are.
+
+    Each layer is scaled and tiled once into strips wide enough that any scroll
+    position is a single blit out of them. A layer is cut into horizontal bands:
+    rows hidden by the opaque part of a nearer layer are dropped, opaque rows are
+    blitted without alpha, and only the ragged edge keeps per-pixel alpha.
+    """
+    def __init__(self):
+        self.bands = []  # (strip, top row, tile width, scroll factor), farthest first
+        covered = SCREEN_H  # rows from here down are hidden by nearer layers
+        for name, factor in reversed(PARALLAX_LAYERS):
+            image = assets.image("backgrounds", name)
+            width = round(image.get_width() * SCREEN_H / image.get_height())
+            image = pygame.transform.smoothscale(image, (width, SCREEN_H))
+            alpha = pygame.surfarray.array_alpha(image)
+            shown = np.flatnonzero(alpha.any(axis=0))
+            top = shown[0] if len(shown) else SCREEN_H
+            ragged = np.flatnonzero((alpha < 255).any(axis=0))
+            opaque = ragged[-1] + 1 if len(ragged) else 0
+            layer = [(opaque, covered, False), (top, min(opaque, covered), True)]
+            for first, last, translucent in layer:
+                if first >= last:
+                    continue
+                strip = pygame.Surface((width * (SCREEN_W // width + 2), last - first), pygame.SRCALPHA)
+                strip = counted(strip.convert_alpha() if translucent else strip.convert())
+                for x in range(0, strip.get_width(), width):
+                    strip.blit(image, (x, -first))
+                self.bands.insert(0, (strip, first, width, factor))
+            covered = min(covered, opaque)
+
+    def draw(self, surface, scroll):
+        for strip, top, width, factor in self.bands:
+            surface.blit(strip, (0, top), (round(scroll * factor) % width, 0, SCREEN_W, strip.get_height()))
+
+
+class FrameProfiler:
+    """Rolling per-phase timings of the game loop, with frame-time percentiles and surface allocations.
+
+    Timing a phase is `with profiler.phase("name"):`; end_frame() closes the row.
+    Surfaces are the ones the game's own creation sites pass through counted().
+    F3 toggles the overlay in the game and F4 writes the rows to a CSV file.
+    """
+    PHASES = ("wait", "background", "events", "handle_input", "apply_gravity", "update_animation",
+              "enemies", "draw", "display")
+
+    def __init__(self, window=600):
+        self.rows = deque(maxlen=window)  # (frame ms, surfaces, ms per phase...)
+        self.current = dict.fromkeys(self.PHASES, 0.0)
+        self.surfaces_start = surfaces_made  # count at the start of the frame
+        self.own_surfaces = 0  # made by the overlay this frame, which is not the game's allocation
+        self.frame_start = time.perf_counter()
+        self.overlay = False
+        self.panel = HudWidget((0, 40), self.render_overlay)
+        self.frames = 0
+        self.name = None
+        self.start = 0.0
+
+    def phase(self, name):
+        self.name = name
+        return self
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.current[self.name] += (time.perf_counter() - self.start) * 1000
+
+    def end_frame(self):
+        now = time.perf_counter()
+        surfaces = surfaces_made - self.surfaces_start - self.own_surfaces
+        self.rows.append(((now - self.frame_start) * 1000, surfaces, *self.current.values()))
+        self.frame_start = now
+        self.current = dict.fromkeys(self.PHASES, 0.0)
+        self.surfaces_start = surfaces_made
+        self.own_surfaces = 0
+        self.frames += 1
+
+    def percentiles(self, points=(50, 95, 99)):
+        times = sorted(row[0] for row in self.rows)
+        return {p: times[min(len(times) - 1, len(times) * p // 100)] for p in points} if times else {}
+
+    def averages(self):
+        """Mean ms per phase and surfaces per frame over the window."""
+        if not self.rows:
+            return {}
+        columns = list(zip(*self.rows))
+        return {name: sum(column) / len(column) for name, column in zip(("frame", "surfaces") + self.PHASES, columns)}
+
+    def dump_csv(self, path):
+        with open(path, "w", newline="") as handle:
+            writer = csv.writer(handle)
+            writer.writerow(("frame_ms", "surfaces") + tuple(f"{name}_ms" for name in self.PHASES))
+            writer.writerows(self.rows)
+
+    def render_overlay(self, _refresh):
+        stats = self.percentiles()
+        averages = self.averages()
+        lines = [f"frame p50 {stats.get(50, 0):5.1f}  p95 {stats.get(95, 0):5.1f}  p99 {stats.get(99, 0):5.1f} ms",
+                 f"surfaces/frame {averages.get('surfaces', 0):5.2f}"]
+        lines += [f"{name:>16s} {averages.get(name, 0):6.2f} ms" for name in self.PHASES]
+        rendered = [text_cache.render(line, (255, 255, 255), "Consolas", 14) for line in lines]
+        panel = counted(pygame.Surface((max(text.get_width() for text in rendered) + 10,
+                                        sum(text.get_height() for text in rendered) + 10)))
+        y = 5
+        for text in rendered:
+            panel.blit(text, (5, y))
+            y += text.get_height()
+        self.panel.pos = (SCREEN_W - panel.get_width() - 10, 40)
+        return panel
+
+    def draw_overlay(self, surface):
+        """Frame-time percentiles and the slowest phases in the top-right corner, refreshed
+        four times a second; returns the rect."""
+        before = surfaces_made
+        box = self.panel.draw(surface, self.frames // 15)
+        self.own_surfaces += surfaces_made - before
+        return box
+
+
+class Game:
+    """Everything the simulation owns, advanced one fixed tick at a time; drawing only reads it."""
+    def __init__(self, stress=0, profiler=None, level_w=SCREEN_W):
+        self.stress = stress
+        self.profiler = profiler or FrameProfiler()
+        self.player = Player(level_w)
+        self.camera = Camera(level_w)
+        # Shared sprites, read from the bundle when the first Flying_eye spawns
+        self.enemies = EnemySwarm(lambda: assets.group("Flying_eye")["sprite"].right[0])
+        self.projectiles = EnemySwarm(lambda: assets.group("Flying_eye")["projectile"].left[0], tracking=False)
+        self.enemy_grid = SpatialHash()
+        self.projectile_grid = SpatialHash()
+        self.spawn_timer = 0
+        self.spawn_interval = 2000  # Spawn every 2000 milliseconds (2 seconds)
+        self.game_over = False
+        self.ticks = 0
+
+    def checksum(self):
+        """CRC of the simulation state, to check that a replay ended where its recording did."""
+        player = self.player
+        state = struct.pack("<iiiiii", player.rect.x, player.rect.y, player.current_health, player.idx,
+                            self.camera.rect.x, self.ticks)
+        for swarm in (self.enemies, self.projectiles):
+            n = len(swarm)
+            state += swarm.x[:n].tobytes() + swarm.y[:n].tobytes()
+        return zlib.crc32(state)
+
+    def tick(self, keys):
+        """Advance the simulation by TICK_MS, whatever the frame rate."""
+        player, profiler = self.player, self.profiler
+        self.ticks += 1
+
+        with profiler.phase("handle_input"):
+            player.prev_pos = player.rect.topleft
+            player.handle_input(keys)
+            self.camera.follow(player.rect)
+        with profiler.phase("apply_gravity"):
+            player.apply_gravity()
+        with profiler.phase("update_animation"):
+            player.update_animation(TICK_MS)
+        with profiler.phase("enemies"):
+            hits = self.update_enemies()
+
+        if hits and not player.dead:
+            player.current_health -= 10 * hits  # Deal damage
             if player.current_health <= 0:
                 player.current_health = 0
                 player.dead = True
@@ -302,25 +992,300 @@ while running:
                 player.speed  = player.state_speeds["death"]
                 player.idx    = 0
                 # Stop further enemy spawns:
-                game_over = True
-
-        enemy.draw(screen)
-
-        # Remove enemy if it's off screen or dead + finished anim
-        if enemy.rect.right < 0 or enemy.dead:
-            enemies.remove(enemy)
-
-    if player.dead:
-        # draw Game Over text
-        font = pygame.font.SysFont("Arial", 150, bold=True)
-        text = font.render("GAME OVER", True, (255,0,0))
-        r = text.get_rect(center=(SCREEN_W//2, SCREEN_H//2))
-        screen.blit(text, r)
-
-        pygame.display.flip()
-        continue  # skips the rest of the loop, no more spawns or movement
-
-
-    pygame.display.flip()
-
-pygame.quit()
+                self.game_over = True
+
+    def update_enemies(self):
+        """Spawn, move, collide and cull enemies and projectiles; returns the hits on the player."""
+        player, enemies, projectiles, view = self.player, self.enemies, self.projectiles, self.camera.rect
+        self.spawn_timer += TICK_MS
+        if not player.dead and self.spawn_timer >= self.spawn_interval:
+            self.spawn_timer = 0
+            spawn_x = view.right + 50  # Start just off the right edge
+            for _ in range(max(1, self.stress)):
+                spawn_y = random.randint(50, 200)  # Random vertical position
+                enemies.spawn(spawn_x, spawn_y)
+
+            # One enemy already on screen spits a projectile at the player
+            shooters = np.flatnonzero(enemies.x[:len(enemies)] < view.right)
+            if len(shooters):
+                i = shooters[random.randrange(len(shooters))]
+                projectiles.load()
+                projectiles.spawn(int(enemies.x[i]), int(enemies.y[i]) + (enemies.h - projectiles.h) // 2, vx=-6)
+
+        # Update enemies, all in one batch; ones far right of the view wait until it comes back
+        enemies.update(player.rect, view.right + 100)
+        projectiles.update(player.rect, view.right + 100)
+
+        # Broad phase: one grid per group, queried by the boxes that can hit that group
+        self.enemy_grid.build(*enemies.boxes())
+        self.projectile_grid.build(*projectiles.boxes())
+        if player.state == "attack":
+            enemies.kill(self.enemy_grid.overlapping(player.attack_rect()))
+        hits = enemies.kill(self.enemy_grid.overlapping(player.rect))
+        hits += projectiles.kill(self.projectile_grid.overlapping(player.rect))
+
+        # Remove enemies and projectiles that are off screen or dead
+        enemies.cull(view.left)
+        projectiles.cull(view.left)
+        return hits
+
+    def draw(self, surface, alpha, scroll=0):
+        """Draw the moving things alpha of the way from the previous tick to the current one; returns their rects."""
+        dirty = [self.player.draw(surface, alpha, scroll), self.player.draw_health_bar(surface)]
+        dirty.extend(self.enemies.draw(surface, alpha, scroll))
+        dirty.extend(self.projectiles.draw(surface, alpha, scroll))
+
+        if self.player.dead:
+            # draw Game Over text
+            text = text_cache.render("GAME OVER", (255,0,0), "Arial", 150, bold=True)
+            r = text.get_rect(center=(SCREEN_W//2, SCREEN_H//2))
+            dirty.append(surface.blit(text, r))
+        return dirty
+
+
+# Keys the game reads, in bit order of the recorded key masks
+RECORDED_KEYS = (pygame.K_LEFT, pygame.K_RIGHT, pygame.K_SPACE, pygame.K_f)
+MASK_KEYS = [defaultdict(bool, {key: bool(mask >> bit & 1) for bit, key in enumerate(RECORDED_KEYS)})
+             for mask in range(1 << len(RECORDED_KEYS))]
+
+
+class InputRecording:
+    """Seed, stress level, level width and per-tick key masks of one session, enough to replay it exactly.
+
+    File: header (magic, version, seed, stress, level width, ticks, checksum of the
+    final state) followed by run-length encoded (run length, key mask) pairs.
+    """
+    MAGIC = b"BOTF"
+    VERSION = 2
+    HEADER = struct.Struct("<4sBQHIII")
+    RUN = struct.Struct("<HB")
+
+    def __init__(self, seed, stress=0, level_w=SCREEN_W, masks=None, checksum=0):
+        self.seed = seed
+        self.stress = stress
+        self.level_w = level_w
+        self.masks = bytearray(masks or b"")
+        self.checksum = checksum
+
+    def __len__(self):
+        return len(self.masks)
+
+    def add(self, keys):
+        self.masks.append(sum(1 << bit for bit, key in enumerate(RECORDED_KEYS) if keys[key]))
+
+    def keys(self, tick):
+        return MASK_KEYS[self.masks[tick]]
+
+    @staticmethod
+    def check(seed, stress, level_w):
+        """Raise ValueError unless the session's settings fit the header, so a recording is never lost at save()."""
+        for name, value, bits in (("seed", seed, 64), ("stress", stress, 16), ("level width", level_w, 32)):
+            if not 0 <= value < 1 << bits:
+                raise ValueError(f"{name} {value} cannot be recorded (0 to {(1 << bits) - 1})")
+
+    def save(self, path):
+        runs = []
+        for mask in self.masks:
+            if runs and runs[-1][1] == mask and runs[-1][0] < 0xFFFF:
+                runs[-1][0] += 1
+            else:
+                runs.append([1, mask])
+        with open(path, "wb") as handle:
+            handle.write(self.HEADER.pack(self.MAGIC, self.VERSION, self.seed, self.stress, self.level_w,
+                                          len(self.masks), self.checksum))
+            handle.write(b"".join(self.RUN.pack(count, mask) for count, mask in runs))
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as handle:
+            data = handle.read()
+        try:
+            magic, version, seed, stress, level_w, ticks, checksum = cls.HEADER.unpack_from(data)
+            if magic != cls.MAGIC or version != cls.VERSION:
+                raise ValueError(f"{path} is not a recording this version can replay")
+            runs = list(cls.RUN.iter_unpack(data[cls.HEADER.size:]))
+        except struct.error:
+            raise ValueError(f"{path} is truncated") from None
+        masks = bytearray()
+        for count, mask in runs:
+            masks += bytes([mask]) * count
+        if len(masks) != ticks:
+            raise ValueError(f"{path} is truncated")
+        return cls(seed, stress, level_w, masks, checksum)
+
+
+def report(label, game, profiler, elapsed, replay=None, profile_csv=None):
+    """Total time, ticks/s and the frame (or tick) time distribution of a run."""
+    ticks = game.ticks
+    print(f"{label}: {ticks} ticks in {elapsed:.2f} s = {ticks / elapsed:.0f} ticks/s "
+          f"({ticks / elapsed / TICK_RATE:.1f}x real time), health {game.player.current_health}, "
+          f"{len(game.enemies)} enemies, {len(game.projectiles)} projectiles")
+    stats = profiler.percentiles()
+    if stats:
+        print(f"frame p50 {stats[50]:.3f}  p95 {stats[95]:.3f}  p99 {stats[99]:.3f} ms; " + ", ".join(
+            f"{name} {ms:.3f}" for name, ms in profiler.averages().items() if ms and name not in ("frame", "surfaces")))
+    if replay is not None:
+        matches = ticks == len(replay) and game.checksum() == replay.checksum
+        print("final state matches the recording" if matches else "final state DIVERGED from the recording")
+    if profile_csv:
+        profiler.dump_csv(profile_csv)
+
+
+def run_headless(ticks, seed, stress=0, level_w=SCREEN_W, replay=None, record=None, profile_csv=None):
+    """Simulate ticks as fast as possible with no rendering; keys come from a replay or a seeded bot."""
+    if replay is not None:
+        ticks, seed, stress, level_w = len(replay), replay.seed, replay.stress, replay.level_w
+    random.seed(seed)
+    bot = random.Random(seed)
+    recording = InputRecording(seed, stress, level_w) if record else None
+    profiler = FrameProfiler(window=max(1, ticks))
+    game = Game(stress, profiler, level_w)
+    keys = defaultdict(bool)
+    start = time.perf_counter()
+    profiler.frame_start = start
+    for i in range(ticks):
+        if replay is not None:
+            keys = replay.keys(i)
+        elif i % 30 == 0:  # the bot changes its mind twice a second
+            keys = MASK_KEYS[sum(1 << bit for bit in range(len(RECORDED_KEYS)) if bot.random() < 0.3)]
+        if recording is not None:
+            recording.add(keys)
+        game.tick(keys)
+        profiler.end_frame()
+    elapsed = time.perf_counter() - start
+    report("replay" if replay is not None else "headless", game, profiler, elapsed, replay, profile_csv)
+    if recording is not None:
+        recording.checksum = game.checksum()
+        recording.save(record)
+
+
+def bench_startup():
+    """Cold start (no bundle, so open_bundle rebuilds it from the PNG sheets) vs warm start (bundle read).
+
+    Each run uses a fresh Assets and loads what setup() does, plus the first enemy type.
+    """
+    for label in ("cold", "warm"):
+        fresh = Assets(base)
+        if label == "cold" and os.path.exists(fresh.bundle_path):
+            os.remove(fresh.bundle_path)
+        start = time.perf_counter()
+        fresh.image("backgrounds", "Floor_01.png")
+        fresh.group("player")
+        fresh.group("Flying_eye")
+        print(f"{label} start: {(time.perf_counter() - start) * 1000:7.1f} ms  ({fresh.startup_report()})")
+
+
+def main(argv=None):
+    args = parser.parse_args(argv)
+    if args.record:
+        try:
+            InputRecording.check(args.seed or 0, args.stress, args.level_screens * SCREEN_W)
+        except ValueError as e:
+            parser.error(str(e))
+    setup(windowed=not (args.bench_animation or args.bench_collisions or args.bench_scrolling
+                        or args.headless or args.build_assets))
+    print(f"startup {(time.perf_counter() - STARTED) * 1000:.0f} ms: {assets.startup_report()}")
+    level_w = args.level_screens * SCREEN_W
+    if args.build_assets:
+        bench_startup()
+    elif args.bench_animation:
+        bench_animation()
+    elif args.bench_collisions:
+        bench_collisions()
+    elif args.bench_scrolling:
+        bench_scrolling()
+    else:
+        replay = InputRecording.load(args.replay) if args.replay else None
+        if args.headless:
+            run_headless(args.ticks, args.seed or 0, args.stress, level_w, replay, args.record, args.profile_csv)
+        else:
+            seed = args.seed if args.seed is not None else random.randrange(1 << 32)
+            run(args.stress, seed, level_w, replay, args.record, args.profile_csv)
+    pygame.quit()
+
+
+def run(stress=0, seed=0, level_w=SCREEN_W, replay=None, record=None, profile_csv=None):
+    if replay is not None:
+        seed, stress, level_w = replay.seed, replay.stress, replay.level_w
+    random.seed(seed)
+    recording = InputRecording(seed, stress, level_w) if record else None
+    profiler = FrameProfiler()
+    game = Game(stress, profiler, level_w)
+    start = time.perf_counter()
+
+    # The scenery (parallax and level chunks) is only recomposed when the view scrolls;
+    # otherwise just the areas sprites and the HUD cover are restored from it
+    parallax = Parallax()
+    level = TileMap(level_w)
+    scenery = pygame.Surface((SCREEN_W, SCREEN_H)).convert()
+    scenery_scroll = None
+    last_dirty = []  # rects drawn last frame
+    accumulator = 0.0
+
+    # ————————————————————— Main Loop —————————————————————
+    running = True
+    while running:
+        with profiler.phase("wait"):
+            accumulator = min(accumulator + clock.tick(TICK_RATE), TICK_MS * MAX_CATCH_UP)
+
+        # Event handling
+        with profiler.phase("events"):
+            for e in pygame.event.get():
+                if e.type == pygame.QUIT:
+                    running = False
+                elif e.type == pygame.KEYDOWN and e.key == pygame.K_F3:
+                    profiler.overlay = not profiler.overlay
+                elif e.type == pygame.KEYDOWN and e.key == pygame.K_F4:
+                    profiler.dump_csv(profile_csv or "frame_profile.csv")
+
+        # Run as many fixed ticks as the elapsed time covers
+        keys = pygame.key.get_pressed()
+        while accumulator >= TICK_MS:
+            if replay is not None:
+                if game.ticks == len(replay):
+                    running = False
+                    break
+                keys = replay.keys(game.ticks)
+            if recording is not None:
+                recording.add(keys)
+            game.tick(keys)
+            accumulator -= TICK_MS
+
+        # Restore the scenery under everything drawn last frame, or all of it if the view moved
+        alpha = accumulator / TICK_MS
+        scroll = game.camera.scroll(alpha)
+        with profiler.phase("background"):
+            scrolled = scroll != scenery_scroll
+            if scrolled:
+                parallax.draw(scenery, scroll)
+                level.draw(scenery, scroll)
+                scenery_scroll = scroll
+                screen.blit(scenery, (0, 0))
+            else:
+                for rect in last_dirty:
+                    screen.blit(scenery, rect, rect)
+        with profiler.phase("draw"):
+            dirty = game.draw(screen, alpha, scroll)
+            if profiler.overlay:
+                dirty.append(profiler.draw_overlay(screen))
+
+        # Only push the changed areas (old and new sprite positions) to the window
+        with profiler.phase("display"):
+            if scrolled:
+                pygame.display.flip()
+            else:
+                pygame.display.update(last_dirty + dirty)
+        last_dirty = dirty
+        profiler.end_frame()
+
+    if replay is not None:
+        report("replay", game, profiler, time.perf_counter() - start, replay, profile_csv)
+    elif profile_csv:
+        profiler.dump_csv(profile_csv)
+    if recording is not None:
+        recording.checksum = game.checksum()
+        recording.save(record)
+
+
+if __name__ == "__main__":
+    main()
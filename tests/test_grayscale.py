@@ -0,0 +1,88 @@
+import cv2
+import numpy as np
+import pytest
+
+from Question1 import ImageDisplay, ImageProcessor, raise_error
+
+
+class Canvas:
+    """Just enough of a Tk canvas for ImageDisplay"""
+    def __init__(self):
+        self.images = []
+
+    def delete(self, *args):
+        pass
+
+    def create_image(self, *args, **kwargs):
+        self.images.append(kwargs.get("image"))
+        return 1
+
+    def config(self, **kwargs):
+        pass
+
+
+def processor(image):
+    editor = ImageProcessor(report_error=raise_error)
+    editor.set_image(image)
+    return editor
+
+
+@pytest.fixture
+def colour():
+    rng = np.random.default_rng(0)
+    return rng.integers(0, 256, (300, 400, 3), dtype=np.uint8)
+
+
+def edited(image, grayscale):
+    editor = processor(image)
+    if grayscale:
+        editor.apply_grayscale()
+    editor.crop_image(20, 10, 380, 290)
+    editor.resize_image(0.5)
+    return editor
+
+
+def test_grayscale_is_single_channel(colour):
+    editor = processor(colour)
+    editor.apply_grayscale()
+    assert editor.current_image.ndim == 2
+    assert editor.current_image.shape == colour.shape[:2]
+    assert editor.preview_image(200).ndim == 2
+
+
+def test_grayscale_uses_a_third_of_the_memory_through_crop_and_resize(colour):
+    gray, rgb = edited(colour, True), edited(colour, False)
+    assert gray.current_image.ndim == 2
+    assert gray.current_image.shape == rgb.current_image.shape[:2]
+    assert gray.current_image.nbytes * 3 == rgb.current_image.nbytes
+    assert gray.preview_image(100).nbytes * 3 == rgb.preview_image(100).nbytes
+
+
+def test_undo_keeps_grayscale_single_channel(colour):
+    editor = edited(colour, True)
+    assert editor.undo()  # the resize
+    assert editor.current_image.ndim == 2
+    assert editor.current_image.shape == (280, 360)
+    while editor.undo():
+        pass
+    assert editor.current_image.ndim == 3
+    assert editor.redo()
+    assert editor.current_image.ndim == 2
+
+
+def test_grayscale_is_saved_as_one_channel(colour, tmp_path):
+    editor = edited(colour, True)
+    path = str(tmp_path / "gray.png")
+    assert editor.save_image(path)
+    saved = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+    assert saved.ndim == 2
+    assert saved.nbytes == editor.current_image.nbytes
+
+
+def test_display_expands_to_rgb_only_at_the_tk_boundary(colour):
+    editor = edited(colour, True)
+    canvas = Canvas()
+    view = ImageDisplay(canvas, photo_factory=lambda image: image, report_error=raise_error)
+    view.update_display(editor.preview_image(view.max_display_size), editor.current_size())
+    assert canvas.images[-1].mode == "RGB"
+    assert editor.current_image.ndim == 2